@@ -0,0 +1,212 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import tempfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import sklearn
+import feature_gen
+import instrumentation
+import main
+import storage
+import synthetic_data
+import tree_inference
+
+# Constants
+BENCHMARK_ROWS = 1_000_000
+BENCHMARK_CARDS = 1000
+FRAUD_RATE = 0.006
+START_DATE = '2019-01-01'
+END_DATE = '2020-06-21'
+RESULTS_DIR = 'assets/benchmarks'
+# The last part of the time span is held out for the inference stages
+TEST_FRACTION = 0.2
+SINGLE_ROW_PREDICTIONS = 10000
+
+# The measurements compared between runs
+COMPARED_FIELDS = ['wall_seconds', 'cpu_seconds', 'peak_traced_bytes', 'peak_rss_growth_bytes']
+
+def run_stage(stage: str, rows: int, function, *args, **kwargs):
+    """
+    Run one stage as an instrumentation stage, silencing its own progress messages.
+
+    The record of the stage gets the wall and CPU time, the peak resident and traced memory
+    growth and, for a table or array result, the output dtypes and sizes.
+
+    Args:
+        stage (str): The name of the stage.
+        rows (int): The number of rows the stage processes, for the throughput.
+        function: The callable to run.
+        *args: Positional arguments for the callable.
+        **kwargs: Keyword arguments for the callable.
+
+    Returns:
+        The return value of the callable.
+    """
+    with instrumentation.stage(stage, rows) as record:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = function(*args, **kwargs)
+        if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray)):
+            record.output(result)
+    return result
+
+def add_feature_step(stage: str, rows: int, step: feature_gen.FeatureStep, processed_df: pd.DataFrame, raw_df: pd.DataFrame) -> None:
+    """
+    Run one feature step as a stage, recording the columns it adds as its output.
+
+    Args:
+        stage (str): The name of the stage.
+        rows (int): The number of rows the step processes.
+        step (FeatureStep): The feature step.
+        processed_df (pd.DataFrame): The feature table the step adds its columns to.
+        raw_df (pd.DataFrame): The raw transactions.
+
+    Returns:
+        None
+    """
+    columns = list(processed_df.columns)
+    with instrumentation.stage(stage, rows) as record:
+        with contextlib.redirect_stdout(io.StringIO()):
+            step.function(processed_df, raw_df, **step.kwargs)
+        record.output(processed_df.drop(columns=columns))
+
+def run_benchmark(rows: int = BENCHMARK_ROWS, cards: int = BENCHMARK_CARDS, fraud_rate: float = FRAUD_RATE,
+                  start: str = START_DATE, end: str = END_DATE, seed: int = 0, track_memory: bool = True) -> dict:
+    """
+    Run the feature, training and inference pipeline on synthetic data and time every stage.
+
+    Args:
+        rows (int): The number of synthetic transactions.
+        cards (int): The number of distinct cards.
+        fraud_rate (float): The fraction of fraudulent transactions.
+        start (str): The first possible transaction date.
+        end (str): The last possible transaction date.
+        seed (int): The random seed of the generator.
+        track_memory (bool): Record peak memory with tracemalloc.
+
+    Returns:
+        dict: The configuration, environment and the instrumentation record of every stage,
+            with its throughput.
+    """
+    recorder = instrumentation.configure(track_memory=track_memory)
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_filepath = os.path.join(work_dir, 'transactions.csv')
+        output_filepath = os.path.join(work_dir, 'features.feather')
+        # Writing the CSV is setup, not part of the pipeline, and is slow under tracemalloc
+        synthetic_data.write_transactions(input_filepath, rows, cards, fraud_rate=fraud_rate, start=start, end=end, seed=seed)
+        print(f"Generated {rows} synthetic transactions")
+
+        raw_df = run_stage('read_raw_data', rows, feature_gen.read_raw_data, input_filepath)
+        processed_df = pd.DataFrame(index=raw_df.index)
+        for step in feature_gen.FEATURE_STEPS:
+            add_feature_step(f"feature:{step.name}", rows, step, processed_df, raw_df)
+        run_stage('write_features', rows, storage.write_features, processed_df, output_filepath)
+
+        columns = main.FEATURES + ['is_fraud', 'trans_date_trans_time']
+        data = run_stage('read_and_clean_data', rows, main.read_and_clean_data, output_filepath, columns)
+
+    # Train on the earlier transactions and predict the later ones
+    cutoff = data['trans_date_trans_time'].quantile(1 - TEST_FRACTION)
+    train, test = data[data['trans_date_trans_time'] <= cutoff], data[data['trans_date_trans_time'] > cutoff]
+    X_train, y_train = train[main.FEATURES], train['is_fraud']
+    X_test, y_test = test[main.FEATURES], test['is_fraud']
+
+    clf = run_stage('train_dtc', len(X_train), main.train_dtc, X_train, y_train, main.MAX_DEPTH)
+    run_stage('eval_classifier', len(X_test), main.eval_classifier, clf, X_test, y_test)
+    compiled = run_stage('compile_tree', clf.tree_.node_count, tree_inference.CompiledTree, clf)
+    X_array = X_test.to_numpy(dtype=np.float32)
+    run_stage('predict:sklearn', len(X_test), clf.predict, X_test)
+    run_stage('predict:compiled', len(X_array), compiled.predict, X_array)
+    single_rows = X_array[:SINGLE_ROW_PREDICTIONS].tolist()
+    run_stage('predict_one:compiled', len(single_rows), lambda: [compiled.predict_one(row) for row in single_rows])
+
+    stages = [dict(record, rows_per_second=record['rows_in'] / record['wall_seconds'] if record['rows_in'] and record['wall_seconds'] > 0 else None)
+              for record in recorder.records]
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'config': {'rows': rows, 'cards': cards, 'fraud_rate': fraud_rate, 'start': start, 'end': end,
+                   'seed': seed, 'track_memory': track_memory},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                        'sklearn': sklearn.__version__},
+        'stages': stages,
+    }
+
+def save_results(results: dict, results_filepath: str = None) -> str:
+    """
+    Save benchmark results as JSON.
+
+    Args:
+        results (dict): The results of run_benchmark.
+        results_filepath (str): The output path, or None for a timestamped file in RESULTS_DIR.
+
+    Returns:
+        str: The path of the saved results.
+    """
+    if results_filepath is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        results_filepath = os.path.join(RESULTS_DIR, f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(results_filepath, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Benchmark results saved to {results_filepath}")
+    return results_filepath
+
+def compare_results(baseline_filepath: str, current_filepath: str) -> pd.DataFrame:
+    """
+    Compare the top-level stages of two saved benchmark runs.
+
+    Args:
+        baseline_filepath (str): The results to compare against.
+        current_filepath (str): The new results.
+
+    Returns:
+        pd.DataFrame: Wall and CPU seconds and peak traced and resident memory growth of both
+            runs per stage, with the ratios current / baseline.
+    """
+    runs = []
+    for file_path in (baseline_filepath, current_filepath):
+        with open(file_path) as file:
+            stages = pd.DataFrame(json.load(file)['stages'])
+        # Skip stages nested in a benchmark stage, e.g. the prediction inside eval_classifier
+        stages = stages[stages['depth'] == 0]
+        runs.append(stages.set_index('stage')[COMPARED_FIELDS].astype(float))
+    comparison = runs[0].join(runs[1], lsuffix='_baseline', rsuffix='_current', how='outer').reindex(runs[1].index)
+    comparison['time_ratio'] = comparison['wall_seconds_current'] / comparison['wall_seconds_baseline']
+    comparison['cpu_ratio'] = comparison['cpu_seconds_current'] / comparison['cpu_seconds_baseline']
+    comparison['memory_ratio'] = comparison['peak_traced_bytes_current'] / comparison['peak_traced_bytes_baseline']
+    return comparison
+
+def main_cli() -> None:
+    """
+    Run the benchmark from the command line and save or compare the results.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the fraud detection pipeline on synthetic data.")
+    parser.add_argument('--rows', type=int, default=BENCHMARK_ROWS)
+    parser.add_argument('--cards', type=int, default=BENCHMARK_CARDS)
+    parser.add_argument('--fraud-rate', type=float, default=FRAUD_RATE)
+    parser.add_argument('--start', default=START_DATE)
+    parser.add_argument('--end', default=END_DATE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="Skip tracemalloc, which slows down Python-heavy stages")
+    parser.add_argument('--output', help="Path of the JSON results, default a timestamped file in " + RESULTS_DIR)
+    parser.add_argument('--compare', help="Earlier JSON results to compare this run against")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.rows, args.cards, args.fraud_rate, args.start, args.end, args.seed, not args.no_memory)
+    results_filepath = save_results(results, args.output)
+    if args.compare:
+        print(compare_results(args.compare, results_filepath).to_string())
+
+if __name__ == '__main__':
+    main_cli()
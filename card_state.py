@@ -0,0 +1,100 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+import feature_gen
+
+class CardState:
+    """
+    Running state of one card, updated one transaction at a time.
+
+    Keeps the time of the last transaction, the number of transactions, amount total and
+    largest amount so far and the transactions inside the trailing time window. The window
+    maximum is tracked with a monotonic deque, so every update is O(1) amortized. Totals
+    are kept in whole cents, like feature_gen.add_cumulative_columns, so the running mean
+    equals the batch one exactly, and so is the window total, like
+    feature_gen.add_multi_window_columns. Amounts are rounded to float32 on entry, as
+    read_raw_data reads them, so the window maximum is the batch one too.
+    """
+
+    __slots__ = ('window', 'last_time', 'count', 'amounts', 'maxima', 'window_cents', 'amount_cents', 'max_cents')
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.last_time = None
+        self.count = 0
+        self.amounts = deque()
+        self.maxima = deque()
+        self.window_cents = 0
+        self.amount_cents = 0
+        self.max_cents = None
+
+    def update(self, time: int, amount: float) -> tuple:
+        """
+        Add a transaction and return the card features as of that transaction.
+
+        Transactions must arrive in time order; an earlier one than the card's last is
+        rejected without changing the state. The window covers (time - window, time], the
+        same convention as the batch rolling features.
+
+        Args:
+            time (int): The transaction time in nanoseconds since the epoch.
+            amount (float): The transaction amount.
+
+        Returns:
+            tuple: (time since last purchase in nanoseconds or None, transaction count,
+            window mean amount, window maximum amount, mean amount to date, maximum amount to date).
+        """
+        if self.last_time is not None and time < self.last_time:
+            raise ValueError(f"Transaction at {time} ns is earlier than the card's last one at {self.last_time} ns")
+        since_last = None if self.last_time is None else time - self.last_time
+        amount = float(np.float32(amount))
+        self.last_time = time
+        self.count += 1
+        cents = round(amount * feature_gen.AMOUNT_SCALE)
+        self.amount_cents += cents
+        self.max_cents = cents if self.max_cents is None else max(self.max_cents, cents)
+
+        self.amounts.append((time, amount, cents))
+        self.window_cents += cents
+        while self.maxima and self.maxima[-1][1] <= amount:
+            self.maxima.pop()
+        self.maxima.append((time, amount))
+
+        # Drop transactions that fell out of the window
+        cutoff = time - self.window
+        while self.amounts[0][0] <= cutoff:
+            self.window_cents -= self.amounts.popleft()[2]
+        while self.maxima[0][0] <= cutoff:
+            self.maxima.popleft()
+
+        return (since_last, self.count, self.window_cents / len(self.amounts) / feature_gen.AMOUNT_SCALE, self.maxima[0][1],
+                self.amount_cents / self.count / feature_gen.AMOUNT_SCALE, self.max_cents / feature_gen.AMOUNT_SCALE)
+
+class CardStateStore:
+    """
+    Running state of every card, created on first sight of the card.
+    """
+
+    def __init__(self, time_frame: str) -> None:
+        self.window = pd.Timedelta(time_frame).value
+        self.cards = {}
+
+    def update(self, cc_num: int, time: int, amount: float) -> tuple:
+        """
+        Add a transaction to its card's state and return the card features as of that transaction.
+
+        Args:
+            cc_num (int): The card number.
+            time (int): The transaction time in nanoseconds since the epoch.
+            amount (float): The transaction amount.
+
+        Returns:
+            tuple: See CardState.update.
+        """
+        state = self.cards.get(cc_num)
+        if state is None:
+            state = self.cards[cc_num] = CardState(self.window)
+        return state.update(time, amount)
+
+    def __len__(self) -> int:
+        return len(self.cards)
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+# Constants
+# Code of values that were not seen in the training data, and of missing values
+UNKNOWN_CODE = -1
+
+class CategoryVocabulary:
+    """
+    The categories of every encoded column, fixed once from the training data.
+
+    Categories are sorted, so the codes are the ones LabelEncoder gives on the training data,
+    and values not in the vocabulary get UNKNOWN_CODE. Each column's categories are hashed
+    once when the vocabulary is built; encoding a column then only looks up its distinct
+    values and maps the rows through a small array, and the categorical columns produced by
+    ingest are mapped through their existing codes without hashing any row.
+    """
+
+    def __init__(self, categories: dict) -> None:
+        self.categories = {column: list(values) for column, values in categories.items()}
+        self._indexes = {column: pd.Index(values) for column, values in self.categories.items()}
+        self._codes = {column: {value: code for code, value in enumerate(values)} for column, values in self.categories.items()}
+
+    def __contains__(self, column: str) -> bool:
+        return column in self.categories
+
+    @classmethod
+    def fit(cls, data: pd.DataFrame, columns: list) -> 'CategoryVocabulary':
+        """
+        Build a vocabulary from the values of the training data.
+
+        Args:
+            data (pd.DataFrame): The training data.
+            columns (list): The columns to encode.
+
+        Returns:
+            CategoryVocabulary: The sorted distinct non-missing values of every column.
+        """
+        categories = {}
+        for column in columns:
+            values = data[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.cat.remove_unused_categories().cat.categories
+            categories[column] = sorted(pd.unique(pd.Series(values).dropna()).tolist())
+        return cls(categories)
+
+    def encode(self, column: str, values: pd.Series) -> np.ndarray:
+        """
+        Encode a column of values.
+
+        Args:
+            column (str): The vocabulary column.
+            values (pd.Series): The values, as strings or a categorical.
+
+        Returns:
+            np.ndarray: The int32 codes, UNKNOWN_CODE for unseen and missing values.
+        """
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            row_codes, distinct = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            row_codes, distinct = pd.factorize(values)
+        lookup = self._indexes[column].get_indexer(distinct)
+        if np.array_equal(lookup, np.arange(len(lookup))):
+            # The codes already are the vocabulary codes, as for categoricals read with the training categories
+            return row_codes.astype(np.int32)
+        # One extra slot so the -1 of missing values lands on UNKNOWN_CODE
+        return np.append(lookup, UNKNOWN_CODE).astype(np.int32)[row_codes]
+
+    def encode_one(self, column: str, value) -> int:
+        """
+        Encode a single value, e.g. of a transaction scored online.
+
+        Args:
+            column (str): The vocabulary column.
+            value: The raw value.
+
+        Returns:
+            int: The code of the value, or UNKNOWN_CODE.
+        """
+        return self._codes[column].get(value, UNKNOWN_CODE)
@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+import model_artifacts
+import storage
+import tree_inference
+
+# Constants
+EVAL_CHUNK_ROWS = 500_000
+# Transactions scoring above the decision threshold are flagged; 0.5 is what predict does
+DECISION_THRESHOLD = 0.5
+THRESHOLDS = [0.1, 0.2, 0.3, 0.5, 0.7, 0.9]
+# A missed fraud costs far more than reviewing a false alarm
+FALSE_POSITIVE_COST = 1.0
+FALSE_NEGATIVE_COST = 100.0
+LABEL_COLUMN = 'is_fraud'
+
+class StreamingMetrics:
+    """
+    Evaluation metrics of a binary classifier, accumulated over batches of predictions.
+
+    Every batch only adds to fixed-size counters: the confusion counts at each threshold and
+    a histogram of the number of fraudulent and genuine transactions per score. A decision
+    tree scores every row with the probability of one of its leaves, so the histogram has at
+    most one bin per leaf and gives the exact precision-recall curve; scores of other models
+    can be rounded into a fixed number of bins instead. The results do not depend on how the
+    rows were split into batches.
+    """
+
+    def __init__(self, thresholds: list = THRESHOLDS, score_bins: int = None) -> None:
+        self.thresholds = sorted(set(thresholds) | {DECISION_THRESHOLD})
+        self.score_bins = score_bins
+        self.rows = 0
+        # Rows per threshold: [false positives, true positives] and the labels
+        self.flagged = np.zeros((len(self.thresholds), 2), dtype=np.int64)
+        self.labels = np.zeros(2, dtype=np.int64)
+        self.scores = np.empty(0, dtype=np.float64)
+        self.histogram = np.empty((0, 2), dtype=np.int64)
+
+    def update(self, y_true, scores) -> None:
+        """
+        Add a batch of labels and fraud scores.
+
+        Args:
+            y_true: The 0/1 fraud labels of the batch.
+            scores: The predicted fraud probabilities of the batch.
+
+        Returns:
+            None
+        """
+        y_true = np.asarray(y_true).astype(bool)
+        scores = np.asarray(scores, dtype=np.float64)
+        self.rows += len(y_true)
+        self.labels += [np.count_nonzero(~y_true), np.count_nonzero(y_true)]
+        for position, threshold in enumerate(self.thresholds):
+            flagged = scores > threshold
+            self.flagged[position] += [np.count_nonzero(flagged & ~y_true), np.count_nonzero(flagged & y_true)]
+
+        if self.score_bins is not None:
+            scores = np.floor(scores * self.score_bins) / self.score_bins
+        # Merge the batch's counts per distinct score into the histogram
+        distinct, inverse = np.unique(np.concatenate([self.scores, scores]), return_inverse=True)
+        histogram = np.zeros((len(distinct), 2), dtype=np.int64)
+        histogram[inverse[:len(self.scores)]] = self.histogram
+        batch = inverse[len(self.scores):]
+        histogram[:, 0] += np.bincount(batch[~y_true], minlength=len(distinct))
+        histogram[:, 1] += np.bincount(batch[y_true], minlength=len(distinct))
+        self.scores, self.histogram = distinct, histogram
+
+    def confusion_matrix(self, threshold: float = DECISION_THRESHOLD) -> np.ndarray:
+        """
+        The confusion matrix at one of the thresholds.
+
+        Args:
+            threshold (float): One of self.thresholds.
+
+        Returns:
+            np.ndarray: [[tn, fp], [fn, tp]], laid out like sklearn's confusion_matrix.
+        """
+        false_positives, true_positives = self.flagged[self.thresholds.index(threshold)]
+        return np.array([[self.labels[0] - false_positives, false_positives],
+                         [self.labels[1] - true_positives, true_positives]])
+
+    def threshold_table(self) -> pd.DataFrame:
+        """
+        Precision, recall and cost-weighted loss at every threshold.
+
+        Returns:
+            pd.DataFrame: One row per threshold with its confusion counts, precision, recall
+                and average cost per transaction.
+        """
+        rows = []
+        for threshold in self.thresholds:
+            (tn, fp), (fn, tp) = self.confusion_matrix(threshold)
+            rows.append({
+                'threshold': threshold,
+                'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+                'precision': tp / (tp + fp) if tp + fp else 0.0,
+                'recall': tp / (tp + fn) if tp + fn else 0.0,
+                'cost': (FALSE_POSITIVE_COST * fp + FALSE_NEGATIVE_COST * fn) / max(self.rows, 1),
+            })
+        return pd.DataFrame(rows)
+
+    def pr_auc(self) -> float:
+        """
+        The area under the precision-recall curve, as average precision.
+
+        Returns:
+            float: The average precision, computed like sklearn's average_precision_score,
+                or NaN without any fraudulent transaction.
+        """
+        if self.labels[1] == 0:
+            return np.nan
+        # Lower the threshold through the distinct scores from the highest down
+        counts = self.histogram[::-1]
+        true_positives = np.cumsum(counts[:, 1])
+        precision = true_positives / np.cumsum(counts.sum(axis=1))
+        return float(np.sum(counts[:, 1] / self.labels[1] * precision))
+
+    def classification_report(self, digits: int = 2) -> str:
+        """
+        The accuracy and per-class report at the decision threshold.
+
+        Args:
+            digits (int): The number of digits of the scores.
+
+        Returns:
+            str: The report, in the layout of sklearn's classification_report.
+        """
+        (tn, fp), (fn, tp) = self.confusion_matrix()
+        rows = []
+        for name, correct, predicted, support in (('0', tn, tn + fn, tn + fp), ('1', tp, tp + fp, tp + fn)):
+            precision = correct / predicted if predicted else 0.0
+            recall = correct / support if support else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            rows.append((name, precision, recall, f1, support))
+        scores = np.array([row[1:4] for row in rows])
+        supports = np.array([row[4] for row in rows])
+        accuracy = (tn + tp) / max(self.rows, 1)
+
+        width = len('weighted avg')
+        row_format = "{:>{width}s} " + " {:>9.{digits}f}" * 3 + " {:>9}\n"
+        report = ("{:>{width}s} " + " {:>9}" * 4).format('', 'precision', 'recall', 'f1-score', 'support', width=width) + "\n\n"
+        for row in rows:
+            report += row_format.format(*row, width=width, digits=digits)
+        report += "\n"
+        report += ("{:>{width}s} " + " {:>9}" * 2 + " {:>9.{digits}f} {:>9}\n").format(
+            'accuracy', '', '', accuracy, self.rows, width=width, digits=digits)
+        report += row_format.format('macro avg', *scores.mean(axis=0), self.rows, width=width, digits=digits)
+        weighted = scores.T @ supports / max(self.rows, 1)
+        report += row_format.format('weighted avg', *weighted, self.rows, width=width, digits=digits)
+        return report
+
+    def report(self) -> str:
+        """
+        The full evaluation report.
+
+        Returns:
+            str: The accuracy and classification report at the decision threshold, the PR-AUC
+                and the precision, recall and cost at every threshold.
+        """
+        (tn, fp), (fn, tp) = self.confusion_matrix()
+        return (f"Accuracy: {(tn + tp) / max(self.rows, 1):.2f}\n"
+                f"{self.classification_report()}\n"
+                f"PR-AUC: {self.pr_auc():.4f}\n"
+                f"{self.threshold_table().to_string(index=False)}")
+
+def evaluate_chunked(artifact: model_artifacts.ModelArtifact, table_filepath: str, batch_rows: int = EVAL_CHUNK_ROWS) -> StreamingMetrics:
+    """
+    Evaluate a saved decision tree on a feature table of any size, one batch of rows at a time.
+
+    Only one batch of features and predictions is in memory at a time. Rows with a missing
+    feature or label are skipped, as read_and_clean_data drops them, so the metrics are the
+    same as evaluating the whole table at once.
+
+    Args:
+        artifact (ModelArtifact): The model to evaluate.
+        table_filepath (str): The processed test feature table (Feather, Parquet or CSV).
+        batch_rows (int): The number of rows per batch.
+
+    Returns:
+        StreamingMetrics: The accumulated metrics.
+    """
+    metrics = StreamingMetrics()
+    compiled = tree_inference.CompiledTree(artifact.clf)
+    fraud_column = list(artifact.clf.classes_).index(1)
+    for batch in storage.iter_features(table_filepath, batch_rows, artifact.features + [LABEL_COLUMN]):
+        batch = batch.dropna()
+        scores = compiled.predict_proba(model_artifacts.model_matrix(artifact, batch))[:, fraud_column]
+        metrics.update(batch[LABEL_COLUMN].to_numpy(), scores)
+    print(f"Evaluated {metrics.rows} rows in batches of {batch_rows}")
+    return metrics
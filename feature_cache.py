@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import pandas as pd
+import storage
+
+# Constants
+CACHE_DIR = 'assets/feature_cache'
+CACHE_MAX_BYTES = 4 * 1024 ** 3
+# Hashing the whole input is exact but reads every byte; size and mtime are usually enough.
+HASH_INPUT_CONTENTS = False
+HASH_BLOCK_SIZE = 1024 ** 2
+# Manifest entry listing the batches incremental.update_features appended to a table
+BATCHES_ENTRY = '__incremental_batches__'
+
+class FeatureCache:
+    """
+    Content-addressed store of computed feature columns.
+
+    Every column is saved as its own Feather file named by a hash of the input file, the
+    parameters and version of the step that produced it, and the column name. Changing any of
+    them produces a new key, so stale columns are never reused, and columns whose inputs did
+    not change are loaded instead of recomputed. Files are touched when read and the least
+    recently used ones are deleted once the cache grows past its size limit.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(input_filepath: str, hash_contents: bool = HASH_INPUT_CONTENTS) -> str:
+        """
+        Identify the contents of an input file.
+
+        Args:
+            input_filepath (str): The path to the input file.
+            hash_contents (bool): Hash the file contents instead of its size and modification time.
+
+        Returns:
+            str: A hex digest identifying the input.
+        """
+        digest = hashlib.sha256()
+        if hash_contents:
+            with open(input_filepath, 'rb') as file:
+                for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+                    digest.update(block)
+        else:
+            stat = os.stat(input_filepath)
+            digest.update(f"{os.path.abspath(input_filepath)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def column_key(fingerprint: str, column: str, params: dict) -> str:
+        """
+        Build the cache key of one feature column.
+
+        Args:
+            fingerprint (str): The fingerprint of the input file.
+            column (str): The name of the feature column.
+            params (dict): Everything else the column depends on, e.g. step name, arguments and versions.
+
+        Returns:
+            str: A hex digest used as the artifact name.
+        """
+        payload = json.dumps([fingerprint, column, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.feather")
+
+    def load(self, key: str) -> pd.Series:
+        """
+        Load a cached column and mark it as recently used.
+
+        Args:
+            key (str): The cache key of the column.
+
+        Returns:
+            pd.Series: The cached column, or None if it is not in the cache.
+        """
+        path = self._path(key)
+        try:
+            os.utime(path)
+            column = storage.read_features(path)
+        except FileNotFoundError:
+            # Never stored, or evicted by another process
+            return None
+        return column[column.columns[0]]
+
+    def store(self, key: str, column: pd.Series) -> None:
+        """
+        Save a column in the cache and evict old columns if the cache is over its size limit.
+
+        Args:
+            key (str): The cache key of the column.
+            column (pd.Series): The column, in the row order of the processed table.
+
+        Returns:
+            None
+        """
+        # Write to a temporary name of this process first so an interrupted run never leaves a truncated artifact
+        path = self._path(key)
+        temporary_path = f"{path}.tmp.{os.getpid()}.feather"
+        storage.write_features(column.reset_index(drop=True).to_frame(), temporary_path)
+        os.replace(temporary_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Delete the least recently used columns until the cache fits in its size limit.
+
+        Several processes may share the cache, e.g. generate_features_many: files being
+        written by another process are left alone, and files another process evicted or
+        replaced in the meantime are skipped.
+
+        Returns:
+            None
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.feather') and '.tmp.' not in entry.name:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    @staticmethod
+    def _manifest_path(output_filepath: str) -> str:
+        return output_filepath + '.manifest.json'
+
+    @classmethod
+    def _read_manifest(cls, output_filepath: str) -> dict:
+        manifest_path = cls._manifest_path(output_filepath)
+        if not (os.path.exists(output_filepath) and os.path.exists(manifest_path)):
+            return {}
+        with open(manifest_path) as file:
+            return json.load(file)
+
+    def is_current(self, output_filepath: str, keys: dict) -> bool:
+        """
+        Check whether an output table was assembled from exactly these column keys.
+
+        A table that batches were appended to afterwards is still current, with the batches.
+
+        Args:
+            output_filepath (str): The path to the assembled feature table.
+            keys (dict): The cache key of every column, by column name.
+
+        Returns:
+            bool: True if the table exists and is up to date.
+        """
+        manifest = self._read_manifest(output_filepath)
+        manifest.pop(BATCHES_ENTRY, None)
+        return bool(manifest) and manifest == keys
+
+    @classmethod
+    def incremental_batches(cls, output_filepath: str) -> list:
+        """
+        List the batches appended to an output table since it was assembled.
+
+        Args:
+            output_filepath (str): The path to the assembled feature table.
+
+        Returns:
+            list: The paths of the appended batch files, oldest first.
+        """
+        return cls._read_manifest(output_filepath).get(BATCHES_ENTRY, [])
+
+    @classmethod
+    def record_batch(cls, output_filepath: str, batch_filepath: str) -> None:
+        """
+        Record in the manifest of an output table that a batch of rows was appended to it.
+
+        Args:
+            output_filepath (str): The path to the updated feature table.
+            batch_filepath (str): The path to the raw transactions of the batch.
+
+        Returns:
+            None
+        """
+        manifest = cls._read_manifest(output_filepath)
+        manifest[BATCHES_ENTRY] = manifest.get(BATCHES_ENTRY, []) + [os.path.abspath(batch_filepath)]
+        with open(cls._manifest_path(output_filepath), 'w') as file:
+            json.dump(manifest, file, indent=2)
+
+    def write_manifest(self, output_filepath: str, keys: dict) -> None:
+        """
+        Record which column keys an output table was assembled from.
+
+        Args:
+            output_filepath (str): The path to the assembled feature table.
+            keys (dict): The cache key of every column, by column name.
+
+        Returns:
+            None
+        """
+        with open(self._manifest_path(output_filepath), 'w') as file:
+            json.dump(keys, file, indent=2)
@@ -0,0 +1,163 @@
+import json
+import os
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import storage
+from category_vocabulary import CategoryVocabulary
+
+# Constants
+STORE_DIR = 'assets/feature_store'
+MATRIX_FILENAME = 'features.npy'
+LABELS_FILENAME = 'labels.npy'
+STRATA_FILENAME = 'strata.npy'
+SCHEMA_FILENAME = 'schema.json'
+SCHEMA_VERSION = 1
+MATRIX_BATCH_ROWS = 500_000
+LABEL_COLUMN = 'is_fraud'
+TIME_COLUMN = 'trans_date_trans_time'
+
+# X is a C-contiguous float32 (rows, features) matrix and y the int8 labels, both usually memory-mapped
+FeatureMatrix = namedtuple('FeatureMatrix', ['X', 'y', 'schema'])
+
+def write_feature_matrix(table_filepath: str, features: list, store_dir: str = STORE_DIR, sort_by_time: bool = True,
+                         vocabulary: CategoryVocabulary = None, strata_columns: list = None,
+                         batch_rows: int = MATRIX_BATCH_ROWS) -> FeatureMatrix:
+    """
+    Materialize selected columns of a processed feature table as a model-ready matrix.
+
+    Rows with a missing feature or label are dropped, as read_and_clean_data does, and string
+    columns are encoded with a category vocabulary, which is kept in the schema. The table is
+    read in batches twice: once to find the complete rows, their times and categories, and
+    once to write every batch straight into a float32 .npy file. Besides one batch, only a few
+    bytes per row are held in memory (the complete flags, labels, strata and, to sort by
+    time, the times and matrix positions), so the only full size copy of the features is the file itself.
+
+    Args:
+        table_filepath (str): The processed feature table (Feather, Parquet or CSV).
+        features (list): The feature columns, in matrix column order.
+        store_dir (str): The directory to hold the matrix, labels and schema.
+        sort_by_time (bool): Order the rows by transaction time, e.g. for time-based validation.
+        vocabulary (CategoryVocabulary): The vocabulary of the training data, or None to build
+            it from this table.
+        strata_columns (list): Integer or datetime columns that are not features, e.g. the card
+            number, to store alongside the matrix for sampling (see load_strata).
+        batch_rows (int): The number of table rows read at a time.
+
+    Returns:
+        FeatureMatrix: The stored matrix, memory-mapped read-only.
+    """
+    strata_columns = [] if strata_columns is None else strata_columns
+    columns = features + [LABEL_COLUMN] + ([TIME_COLUMN] if sort_by_time and TIME_COLUMN not in features else [])
+    columns += [column for column in strata_columns if column not in columns]
+
+    # First pass: the complete rows, their times and the categories of the string columns
+    encoded, complete, times, categories = None, [], [], {}
+    for batch in storage.iter_features(table_filepath, batch_rows, columns):
+        if encoded is None:
+            encoded = [feature for feature in features
+                       if not (pd.api.types.is_numeric_dtype(batch[feature]) or pd.api.types.is_bool_dtype(batch[feature]))]
+        keep = batch[features + [LABEL_COLUMN]].notna().all(axis=1).to_numpy()
+        complete.append(keep)
+        if sort_by_time:
+            times.append(batch[TIME_COLUMN].to_numpy(dtype='datetime64[ns]')[keep])
+        if vocabulary is None:
+            for feature, values in CategoryVocabulary.fit(batch[keep], encoded).categories.items():
+                categories.setdefault(feature, set()).update(values)
+    encoded = [] if encoded is None else encoded
+    complete = np.concatenate(complete) if complete else np.zeros(0, dtype=bool)
+    rows = int(np.count_nonzero(complete))
+    if vocabulary is None:
+        vocabulary = CategoryVocabulary({feature: sorted(categories.get(feature, ())) for feature in encoded})
+    # The matrix row of every complete table row, when sorting moves them
+    destination = None
+    if sort_by_time:
+        destination = np.empty(rows, dtype=np.int64)
+        destination[np.argsort(np.concatenate(times) if times else np.zeros(0, dtype='datetime64[ns]'), kind='stable')] = np.arange(rows)
+    del times
+
+    # Second pass: write every batch into its matrix rows
+    os.makedirs(store_dir, exist_ok=True)
+    matrix_path = os.path.join(store_dir, MATRIX_FILENAME)
+    X = np.lib.format.open_memmap(matrix_path + '.tmp', mode='w+', dtype=np.float32, shape=(rows, len(features)))
+    labels = np.empty(rows, dtype=np.int8)
+    strata = np.empty((rows, len(strata_columns)), dtype=np.int64)
+    table_row, matrix_row = 0, 0
+    for batch in storage.iter_features(table_filepath, batch_rows, columns):
+        keep = complete[table_row:table_row + len(batch)]
+        table_row += len(batch)
+        batch = batch[keep]
+        targets = slice(matrix_row, matrix_row + len(batch)) if destination is None else destination[matrix_row:matrix_row + len(batch)]
+        matrix_row += len(batch)
+        block = np.empty((len(batch), len(features)), dtype=np.float32)
+        for position, feature in enumerate(features):
+            values = batch[feature]
+            if feature in encoded:
+                values = vocabulary.encode(feature, values)
+            elif pd.api.types.is_timedelta64_dtype(values):
+                values = values.dt.total_seconds()
+            block[:, position] = np.asarray(values)
+        X[targets] = block
+        labels[targets] = batch[LABEL_COLUMN].to_numpy(dtype=np.int8)
+        for position, column in enumerate(strata_columns):
+            # Datetimes are stored as int64 nanoseconds
+            values = batch[column].to_numpy()
+            strata[targets, position] = values.view(np.int64) if pd.api.types.is_datetime64_dtype(batch[column]) else values.astype(np.int64)
+    X.flush()
+    del X
+    np.save(os.path.join(store_dir, LABELS_FILENAME), labels)
+    if strata_columns:
+        np.save(os.path.join(store_dir, STRATA_FILENAME), strata)
+    os.replace(matrix_path + '.tmp', matrix_path)
+
+    schema = {
+        'version': SCHEMA_VERSION,
+        'source': table_filepath,
+        'rows': rows,
+        'features': features,
+        'label': LABEL_COLUMN,
+        'sorted_by_time': sort_by_time,
+        'categories': {feature: vocabulary.categories[feature] for feature in encoded},
+        'strata': strata_columns,
+    }
+    with open(os.path.join(store_dir, SCHEMA_FILENAME), 'w') as file:
+        json.dump(schema, file, indent=2)
+    print(f"Feature matrix of {rows} rows saved to {store_dir}")
+    return load_feature_matrix(store_dir)
+
+def load_feature_matrix(store_dir: str = STORE_DIR, mmap_mode: str = 'r') -> FeatureMatrix:
+    """
+    Load a stored feature matrix without copying it.
+
+    Args:
+        store_dir (str): The directory written by write_feature_matrix.
+        mmap_mode (str): The np.load memory map mode, or None to read the arrays into memory.
+
+    Returns:
+        FeatureMatrix: The matrix, labels and schema.
+    """
+    with open(os.path.join(store_dir, SCHEMA_FILENAME)) as file:
+        schema = json.load(file)
+    if schema['version'] != SCHEMA_VERSION:
+        raise ValueError(f"Feature store {store_dir} has schema version {schema['version']}, expected {SCHEMA_VERSION}")
+    X = np.load(os.path.join(store_dir, MATRIX_FILENAME), mmap_mode=mmap_mode)
+    y = np.load(os.path.join(store_dir, LABELS_FILENAME), mmap_mode=mmap_mode)
+    return FeatureMatrix(X, y, schema)
+
+def load_strata(store_dir: str = STORE_DIR, column: str = None, mmap_mode: str = 'r') -> np.ndarray:
+    """
+    Load a strata column stored with write_feature_matrix, in matrix row order.
+
+    Args:
+        store_dir (str): The directory written by write_feature_matrix.
+        column (str): One of the schema's 'strata' columns.
+        mmap_mode (str): The np.load memory map mode, or None to read the array into memory.
+
+    Returns:
+        np.ndarray: The int64 values of the column, datetimes as nanoseconds since the epoch.
+    """
+    with open(os.path.join(store_dir, SCHEMA_FILENAME)) as file:
+        strata_columns = json.load(file).get('strata', [])
+    if column not in strata_columns:
+        raise ValueError(f"Feature store {store_dir} has no strata column {column}, only {strata_columns}")
+    return np.load(os.path.join(store_dir, STRATA_FILENAME), mmap_mode=mmap_mode)[:, strata_columns.index(column)]
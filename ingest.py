@@ -0,0 +1,105 @@
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+# Constants
+# Declared types of the Kaggle transaction files. Low-cardinality strings are categorical,
+# amounts are float32 and the timestamps are parsed at read time with a fixed format.
+RAW_SCHEMA = {
+    'trans_date_trans_time': 'datetime64[ns]',
+    'cc_num': 'int64',
+    'merchant': 'category',
+    'category': 'category',
+    'amt': 'float32',
+    'first': 'category',
+    'last': 'category',
+    'gender': 'category',
+    'street': 'category',
+    'city': 'category',
+    'state': 'category',
+    'zip': 'int32',
+    'lat': 'float64',
+    'long': 'float64',
+    'city_pop': 'int32',
+    'job': 'category',
+    'dob': 'datetime64[ns]',
+    'trans_num': 'string',
+    'unix_time': 'int64',
+    'merch_lat': 'float64',
+    'merch_long': 'float64',
+    'is_fraud': 'int8',
+}
+DATETIME_FORMATS = {
+    'trans_date_trans_time': '%Y-%m-%d %H:%M:%S',
+    'dob': '%Y-%m-%d',
+}
+
+def _arrow_type(dtype: str):
+    # Map a RAW_SCHEMA dtype to the type the pyarrow CSV reader should produce directly
+    if dtype == 'category':
+        return pa.dictionary(pa.int32(), pa.string())
+    if dtype == 'string':
+        return pa.string()
+    if dtype.startswith('datetime64'):
+        return pa.timestamp('ns')
+    return pa.from_numpy_dtype(dtype)
+
+def _read_csv_pandas(file_path: str, columns: list, chunksize: int):
+    dates = [column for column in DATETIME_FORMATS if columns is None or column in columns]
+    dtypes = {column: dtype for column, dtype in RAW_SCHEMA.items() if column not in DATETIME_FORMATS}
+    return pd.read_csv(file_path, usecols=columns, dtype=dtypes, parse_dates=dates,
+                       date_format={column: DATETIME_FORMATS[column] for column in dates}, chunksize=chunksize)
+
+def _read_csv_arrow(file_path: str, columns: list) -> pd.DataFrame:
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=columns,
+        column_types={column: _arrow_type(dtype) for column, dtype in RAW_SCHEMA.items()},
+        timestamp_parsers=list(DATETIME_FORMATS.values()),
+    )
+    table = pa_csv.read_csv(file_path, convert_options=convert_options)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def _normalize_dates(df: pd.DataFrame) -> pd.DataFrame:
+    # Both readers may pick their own datetime resolution; the pipeline works in nanoseconds
+    for column in DATETIME_FORMATS:
+        if column in df.columns and df[column].dtype != RAW_SCHEMA[column]:
+            df[column] = df[column].astype(RAW_SCHEMA[column])
+    return df
+
+def read_transactions(file_path: str, columns: list = None) -> pd.DataFrame:
+    """
+    Read a transactions CSV file with the declared RAW_SCHEMA types.
+
+    Only the requested columns are parsed. The multithreaded pyarrow CSV reader is used when
+    it is installed, pandas' C parser otherwise. Columns that are not in RAW_SCHEMA (e.g. in
+    processed CSV exports) keep their inferred types.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        columns (list): The columns to read, or None for all of them.
+
+    Returns:
+        pd.DataFrame: The typed transactions.
+    """
+    if pa is not None:
+        return _normalize_dates(_read_csv_arrow(file_path, columns))
+    return _normalize_dates(_read_csv_pandas(file_path, columns, None))
+
+def iter_transactions(file_path: str, chunksize: int, columns: list = None):
+    """
+    Read a transactions CSV file in chunks with the declared RAW_SCHEMA types.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        chunksize (int): The number of rows per chunk.
+        columns (list): The columns to read, or None for all of them.
+
+    Yields:
+        pd.DataFrame: The typed transactions of each chunk, indexed by row number in the file.
+    """
+    for chunk in _read_csv_pandas(file_path, columns, chunksize):
+        yield _normalize_dates(chunk)
@@ -0,0 +1,246 @@
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the resident memory growth is not recorded
+    resource = None
+
+# Constants
+TRACE_FILEPATH = 'assets/trace.json'
+PROFILE_DIR = 'assets/profiles'
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+# Lines of the cProfile or tracemalloc summary printed for a profiled stage
+PROFILE_TOP_LINES = 25
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+MAXRSS_BYTES = 1 if sys.platform == 'darwin' else 1024
+
+def _maxrss() -> int:
+    # The process's peak resident memory so far, in the unit of MAXRSS_BYTES
+    return 0 if resource is None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class StageRecord(dict):
+    """
+    The measurements of one stage, filled in while it runs.
+
+    A stage that produces a table or array passes it to output() so its row count and the
+    size of every output column are recorded.
+    """
+
+    def output(self, data) -> None:
+        """
+        Record the output of the stage.
+
+        Args:
+            data: A DataFrame, Series or NumPy array.
+
+        Returns:
+            None
+        """
+        self['rows_out'] = len(data)
+        if isinstance(data, pd.DataFrame):
+            sizes = data.memory_usage(index=False, deep=False)
+            self['output'] = {column: {'dtype': str(data[column].dtype), 'bytes': int(sizes[column])} for column in data.columns}
+        elif isinstance(data, (pd.Series, np.ndarray)):
+            self['output'] = {'dtype': str(data.dtype), 'bytes': int(data.nbytes)}
+
+class Instrumentation:
+    """
+    Records wall time, CPU time, memory and row counts of named pipeline stages.
+
+    Every stage reports the growth of the process's peak resident memory, which costs
+    nothing to read. With track_memory, the peak of the memory traced by tracemalloc above
+    the start of the stage is recorded too; NumPy and pandas buffers are traced, but pure
+    Python code runs noticeably slower. A single stage can also be run under cProfile or
+    with a tracemalloc snapshot, to see which functions or lines its time or memory goes to.
+    Stages may be nested, e.g. the feature steps inside a feature generation stage.
+    """
+
+    def __init__(self, track_memory: bool = False, profile_stage: str = None, profile_mode: str = 'cprofile',
+                 verbose: bool = True) -> None:
+        if profile_mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {profile_mode}, expected one of {PROFILE_MODES}")
+        self.track_memory = track_memory
+        self.profile_stage = profile_stage
+        self.profile_mode = profile_mode
+        self.verbose = verbose
+        self.records = []
+        self._origin = time.perf_counter()
+        self._stack = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows_in: int = None):
+        """
+        Measure the code run inside the with block as one stage.
+
+        Args:
+            name (str): The name of the stage, e.g. 'feature:rolling'.
+            rows_in (int): The number of input rows, if known.
+
+        Yields:
+            StageRecord: The record of the stage, see StageRecord.output.
+        """
+        record = StageRecord(stage=name, depth=len(self._stack), rows_in=rows_in, rows_out=None)
+        tracing = self.track_memory or (name == self.profile_stage and self.profile_mode == 'tracemalloc')
+        started_tracing = tracing and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if tracing:
+            traced_baseline = tracemalloc.get_traced_memory()[0]
+            # Resetting the peak hides it from enclosing stages, so it is handed back on exit
+            outer_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+        profiler = cProfile.Profile() if name == self.profile_stage and self.profile_mode == 'cprofile' else None
+        frame = {'child_peak': 0}
+        self._stack.append(frame)
+
+        maxrss_start = _maxrss()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            wall = time.perf_counter() - wall_start
+            record['start_seconds'] = wall_start - self._origin
+            record['wall_seconds'] = wall
+            record['cpu_seconds'] = time.process_time() - cpu_start
+            record['peak_rss_growth_bytes'] = None if resource is None else (_maxrss() - maxrss_start) * MAXRSS_BYTES
+            self._stack.pop()
+            if tracing:
+                peak = max(tracemalloc.get_traced_memory()[1], frame['child_peak'])
+                record['peak_traced_bytes'] = peak - traced_baseline
+                if self._stack:
+                    self._stack[-1]['child_peak'] = max(self._stack[-1]['child_peak'], peak, outer_peak)
+                if name == self.profile_stage and self.profile_mode == 'tracemalloc':
+                    self._report_tracemalloc(name)
+            if started_tracing:
+                tracemalloc.stop()
+            if profiler is not None:
+                self._report_profile(name, profiler)
+            self.records.append(record)
+            if self.verbose:
+                print(self.describe(record))
+
+    @staticmethod
+    def describe(record: StageRecord) -> str:
+        """
+        Format a stage record as a one line progress message.
+
+        Args:
+            record (StageRecord): A finished stage.
+
+        Returns:
+            str: The message.
+        """
+        message = f"{'  ' * record['depth']}{record['stage']}: {record['wall_seconds']:.3f} s wall, {record['cpu_seconds']:.3f} s CPU"
+        rows = record['rows_out'] if record['rows_out'] is not None else record['rows_in']
+        if rows is not None:
+            message += f", {rows:,} rows"
+        if record.get('peak_traced_bytes') is not None:
+            message += f", peak {record['peak_traced_bytes'] / 1024 ** 2:.1f} MiB"
+        if isinstance(record.get('output'), dict) and 'dtype' not in record['output']:
+            message += f" -> {', '.join(record['output'])}"
+        return message
+
+    def _report_profile(self, name: str, profiler: cProfile.Profile) -> None:
+        # Keep the raw profile for snakeviz or pstats and print the most expensive calls
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile_path = os.path.join(PROFILE_DIR, f"{name.replace(':', '_')}.prof")
+        profiler.dump_stats(profile_path)
+        print(f"Profile of {name} saved to {profile_path}")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(PROFILE_TOP_LINES)
+
+    def _report_tracemalloc(self, name: str) -> None:
+        # The lines holding the most memory when the stage ends
+        print(f"Largest allocations alive at the end of {name}:")
+        for statistic in tracemalloc.take_snapshot().statistics('lineno')[:PROFILE_TOP_LINES]:
+            print(f"  {statistic}")
+
+    def write_json(self, file_path: str) -> None:
+        """
+        Save the stage records as a JSON list.
+
+        Args:
+            file_path (str): The output path.
+
+        Returns:
+            None
+        """
+        with open(file_path, 'w') as file:
+            json.dump(self.records, file, indent=2)
+        print(f"Stage records saved to {file_path}")
+
+    def write_chrome_trace(self, file_path: str = TRACE_FILEPATH) -> None:
+        """
+        Save the stages as a Chrome trace, viewable in chrome://tracing or ui.perfetto.dev.
+
+        Args:
+            file_path (str): The output path.
+
+        Returns:
+            None
+        """
+        events = [{
+            'name': record['stage'],
+            'ph': 'X',
+            'ts': record['start_seconds'] * 1e6,
+            'dur': record['wall_seconds'] * 1e6,
+            'pid': os.getpid(),
+            'tid': 0,
+            'args': {key: value for key, value in record.items() if key not in ('stage', 'start_seconds', 'wall_seconds')},
+        } for record in self.records]
+        with open(file_path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        print(f"Chrome trace saved to {file_path}")
+
+# The instrumentation the pipeline stages report to
+_current = Instrumentation()
+
+def configure(**kwargs) -> Instrumentation:
+    """
+    Start recording into a new Instrumentation, e.g. to turn on memory tracking or profiling.
+
+    Args:
+        **kwargs: Arguments for Instrumentation.
+
+    Returns:
+        Instrumentation: The new instrumentation, also returned by current().
+    """
+    global _current
+    _current = Instrumentation(**kwargs)
+    return _current
+
+def current() -> Instrumentation:
+    """
+    The instrumentation the pipeline stages currently report to.
+
+    Returns:
+        Instrumentation: The current instrumentation.
+    """
+    return _current
+
+def stage(name: str, rows_in: int = None):
+    """
+    Measure a block of code as a stage of the current instrumentation, see Instrumentation.stage.
+
+    Args:
+        name (str): The name of the stage.
+        rows_in (int): The number of input rows, if known.
+
+    Returns:
+        The context manager of the stage.
+    """
+    return _current.stage(name, rows_in)
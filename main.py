@@ -1,126 +1,335 @@
-import os
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import evaluation
 import feature_gen
+import feature_store
+import instrumentation
+import model_artifacts
+import sampling
+import storage
+import tree_inference
+import numpy as np
 import pandas as pd
-from sklearn.preprocessing import LabelEncoder
+from category_vocabulary import CategoryVocabulary
 from sklearn.tree import DecisionTreeClassifier
-from sklearn.metrics import accuracy_score, classification_report
 
 # Constants
 MAX_DEPTH = 10
+FEATURES = ['category', 'amt', 'city_pop', 'transactions to date', 'average amount over 30 days', 'maximum amount over 30 days']
+TEST_FILEPATH = 'assets/fraudTest.csv'
+TEST_OUTPUT_FILEPATH = 'assets/processedFraudTest.feather'
+SCORING_OUTPUT_FILEPATH = 'assets/processedScoring.feather'
+SCORES_FILEPATH = 'assets/scores.feather'
 
-def generate_new_features() -> str:
+def generate_new_features(input_filepath: str = feature_gen.INPUT_FILEPATH, features: list = None,
+                          output_filepath: str = None) -> str:
     """
-    If the training data has not been feature engineered, new features are generated.
+    Generate the features of the training data, reusing cached feature columns that are still valid.
     
     Args:
-        None
+        input_filepath (str): The path to the raw training transactions.
+        features (list): The feature columns needed, or None for all of them. Only the steps
+            computing these are run.
+        output_filepath (str): Where to save the processed dataframe, or None for feature_gen.OUTPUT_FILEPATH.
         
     Returns:
-        None
+        str: The filepath of the processed dataframe.
     """
-    if not os.path.exists(feature_gen.OUTPUT_FILEPATH):
-        feature_gen.main()
-    return feature_gen.OUTPUT_FILEPATH
+    return feature_gen.generate_features(input_filepath, output_filepath, features)
 
-def read_and_clean_data(file_path: str) -> pd.DataFrame:
+def read_and_clean_data(file_path: str, columns: list = None, vocabulary: CategoryVocabulary = None) -> pd.DataFrame:
     """
     Read the dataset from the given file path and perform necessary cleaning.
 
     Args:
-        file_path (str): The path to the CSV file.
+        file_path (str): The path to the Feather, Parquet or CSV file.
+        columns (list): The columns to read, or None for all of them.
+        vocabulary (CategoryVocabulary): The vocabulary of the training data, so test data gets
+            the same category codes, or None to build it from this data.
 
     Returns:
         pd.DataFrame: The cleaned DataFrame.
     """
-    data = pd.read_csv(file_path)
+    data = storage.read_features(file_path, columns)
 
     # Drop rows with missing values
     data.dropna(inplace=True)
 
-    # Label encoding for binary categories
-    label_encoder = LabelEncoder()
-    data['category'] = label_encoder.fit_transform(data['category'])
+    # Encode the categories with the training codes
+    vocabulary = CategoryVocabulary.fit(data, ['category']) if vocabulary is None else vocabulary
+    data['category'] = vocabulary.encode('category', data['category'])
 
     return data
 
-def train_dtc(X: pd.DataFrame, y: pd.Series, max_depth: int) -> DecisionTreeClassifier:
+def train_dtc(X: pd.DataFrame, y: pd.Series, max_depth: int, sample_weight: np.ndarray = None) -> DecisionTreeClassifier:
     """
     Train a decision tree classifier.
 
     Args:
-        X (pd.DataFrame): Features DataFrame.
+        X (pd.DataFrame): Features DataFrame, or a float32 feature matrix, which is used without a copy.
         y (pd.Series): Target variable.
         max_depth (int): Maximum depth of the decision tree.
+        sample_weight (np.ndarray): The weight of every row, e.g. of a downsampled training set, or None.
 
     Returns:
         DecisionTreeClassifier: Trained classifier.
     """
     clf = DecisionTreeClassifier(max_depth=max_depth)
-    clf.fit(X, y)
+    clf.fit(X, y, sample_weight=sample_weight)
     return clf
 
 def eval_classifier(clf: DecisionTreeClassifier, X_test: pd.DataFrame, y_test: pd.Series) -> None:
     """
-    Evaluate the classifier on the test set and print accuracy and classification report.
+    Evaluate the classifier on the test set and print accuracy, classification report, PR-AUC
+    and precision, recall and cost at several thresholds.
+
+    Predictions come from the classifier compiled into flat node arrays, which gives the same
+    result as clf.predict without its per-call validation and conversion overhead. The report
+    is the one evaluation.evaluate_chunked gives for test sets that do not fit in memory.
 
     Args:
         clf (DecisionTreeClassifier): Trained classifier.
-        X_test (pd.DataFrame): Test set features.
+        X_test (pd.DataFrame): Test set features, or a float32 feature matrix.
         y_test (pd.Series): Test set target variable.
 
     Returns:
         None
     """
-    y_pred = clf.predict(X_test)
-    accuracy = accuracy_score(y_test, y_pred)
-    report = classification_report(y_test, y_pred)
+    fraud_column = list(clf.classes_).index(1)
+    with instrumentation.stage('predict', len(X_test)) as stage:
+        scores = tree_inference.CompiledTree(clf).predict_proba(np.asarray(X_test, dtype=np.float32))[:, fraud_column]
+        stage.output(scores)
+    metrics = evaluation.StreamingMetrics()
+    metrics.update(y_test, scores)
+    print(metrics.report())
 
-    print(f"Accuracy: {accuracy:.2f}")
-    print(report)
-    
-def main() -> None:
+def fit_feature_matrix(features: list, max_depth: int = MAX_DEPTH, negative_rate: float = None, stratify: str = None,
+                       store_dir: str = feature_store.STORE_DIR) -> tuple:
     """
-    Main function for training & testing dataset.
+    Fit the classifier on a stored training matrix, on all rows or on a downsampled training set.
 
-    Reads in a processed dataset and cleans it. Selects the features for training.
-    Trains the Decision Tree Classifier and evaluates it on the test set.
-    
     Args:
-        None
-        
+        features (list): The feature columns of the matrix.
+        max_depth (int): Maximum depth of the decision tree.
+        negative_rate (float): Fit on every fraudulent row and this share of the legitimate
+            ones (see sampling.downsample), or None to fit on all rows.
+        stratify (str): Sample the legitimate rows per 'card' or per 'time' period, or None.
+        store_dir (str): The directory written by feature_store.write_feature_matrix.
+
+    Returns:
+        tuple: The trained classifier and the summary of the sample, or None without sampling.
+    """
+    training_matrix = feature_store.load_feature_matrix(store_dir)
+    X, y, sample_weight, summary = training_matrix.X, training_matrix.y, None, None
+    if negative_rate is not None:
+        strata = None if stratify is None else feature_store.load_strata(store_dir, sampling.STRATA_COLUMNS[stratify])
+        sample = sampling.downsample(training_matrix, negative_rate, strata, stratify)
+        X, y, sample_weight, summary = sample.X, sample.y, sample.sample_weight, sample.summary
+    with instrumentation.stage('fit', len(y)) as stage:
+        clf = train_dtc(X, y, max_depth, sample_weight)
+        stage['feature_importances'] = dict(zip(features, clf.feature_importances_.tolist()))
+    print(f"Feature importances: {stage['feature_importances']}")
+    return clf, summary
+
+def _fit_with_memory_tracking(features: list, max_depth: int, negative_rate: float, stratify: str, store_dir: str) -> tuple:
+    # Runs in a new process, whose peak resident memory starts from its own, so the growth is this training's alone
+    instrumentation.configure(track_memory=True, verbose=False)
+    with instrumentation.stage('train'):
+        clf, summary = fit_feature_matrix(features, max_depth, negative_rate, stratify, store_dir)
+    return clf, summary, [dict(record) for record in instrumentation.current().records]
+
+def train(input_filepath: str = feature_gen.INPUT_FILEPATH, features: list = FEATURES, max_depth: int = MAX_DEPTH,
+          models_dir: str = model_artifacts.MODELS_DIR, negative_rate: float = None, stratify: str = None) -> str:
+    """
+    Train the classifier on raw training transactions and save it as a new model version.
+
+    Args:
+        input_filepath (str): The path to the raw training transactions.
+        features (list): The feature columns to train on.
+        max_depth (int): Maximum depth of the decision tree.
+        models_dir (str): The directory holding all model versions.
+        negative_rate (float): Train on every fraudulent transaction and this share of the
+            legitimate ones, weighted to stand for all of them (see sampling.downsample), or
+            None to train on all rows.
+        stratify (str): Sample the legitimate transactions per 'card' or per 'time' period, or None.
+
+    Returns:
+        str: The path of the saved model artifact.
+    """
+    strata_columns = [] if stratify is None else [sampling.STRATA_COLUMNS[stratify]]
+    training_data = generate_new_features(input_filepath, features + ['is_fraud'] + strata_columns)
+
+    # Materialize the selected training columns once as a float32 matrix that is fitted without a copy
+    with instrumentation.stage('feature_matrix') as stage:
+        training_matrix = feature_store.write_feature_matrix(training_data, features, sort_by_time=False,
+                                                             strata_columns=strata_columns)
+        stage.output(training_matrix.X)
+    clf, summary = fit_feature_matrix(features, max_depth, negative_rate, stratify)
+
+    metadata = {'training_data': input_filepath, 'rows': training_matrix.schema['rows'], 'max_depth': max_depth}
+    if summary is not None:
+        metadata['sampling'] = summary
+    vocabulary = CategoryVocabulary(training_matrix.schema['categories'])
+    artifact = model_artifacts.ModelArtifact(clf, features, vocabulary, metadata)
+    return model_artifacts.save_model(artifact, models_dir)
+
+def evaluate(model_path: str = None, test_filepath: str = TEST_FILEPATH, batch_rows: int = evaluation.EVAL_CHUNK_ROWS) -> None:
+    """
+    Evaluate a saved model on raw test transactions.
+
+    Args:
+        model_path (str): The model artifact, or None for the latest saved model.
+        test_filepath (str): The path to the raw test transactions.
+        batch_rows (int): Evaluate the test features in batches of this many rows, or None
+            to load them all at once.
+
     Returns:
         None
     """
-    training_data = generate_new_features()
-    # Process training data
-    processed_data_train = read_and_clean_data(training_data)
+    artifact = model_artifacts.load_model(model_path)
+    test_data = generate_new_features(test_filepath, artifact.features + ['is_fraud'], TEST_OUTPUT_FILEPATH)
+    if batch_rows is not None:
+        with instrumentation.stage('evaluate'):
+            metrics = evaluation.evaluate_chunked(artifact, test_data, batch_rows)
+        print(metrics.report())
+        return
+    with instrumentation.stage('read_features') as stage:
+        processed_data_test = storage.read_features(test_data, artifact.features + ['is_fraud']).dropna()
+        stage.output(processed_data_test)
+    eval_classifier(artifact.clf, model_artifacts.model_matrix(artifact, processed_data_test), processed_data_test['is_fraud'])
 
-    # Select features and target variable for training
-    features_train = ['category', 'amt', 'city_pop', 'total_transactions', 'average amount over 30 days', 'maximum amount over 30 days']
-    X_train = processed_data_train[features_train]
-    y_train = processed_data_train['is_fraud']
+def score(input_filepath: str, output_filepath: str = SCORES_FILEPATH, model_path: str = None) -> str:
+    """
+    Score raw transactions with a saved model, without any training.
 
-    # Train the decision tree classifier
-    clf = train_dtc(X_train, y_train, MAX_DEPTH)
-    
-    # Printing the importance of each feature
-    print(clf.feature_importances_)
+    Args:
+        input_filepath (str): The path to the raw transactions to score.
+        output_filepath (str): Where to save the scores (Feather, Parquet or CSV).
+        model_path (str): The model artifact, or None for the latest saved model.
 
-    # Evaluate the classifier on the test set
-    processed_data_test = read_and_clean_data('assets/fraudTest.csv')
-    
-    # Check if features are present in the test data
-    features_test = features_train
-    missing_features = set(features_test) - set(processed_data_test.columns)
-    
-    if missing_features:
-        raise ValueError(f"Missing features in test data: {missing_features}")
-    
-    features_test = features_train  # Assuming the same features are used for testing
-    X_test = processed_data_test[features_test]
-    y_test = processed_data_test['is_fraud']
-    
-    eval_classifier(clf, X_test, y_test)
+    Returns:
+        str: The path of the saved scores, one row per transaction with its card, time and fraud probability.
+    """
+    artifact = model_artifacts.load_model(model_path)
+    columns = ['cc_num', 'trans_date_trans_time'] + [feature for feature in artifact.features if feature not in ('cc_num', 'trans_date_trans_time')]
+    processed_data = storage.read_features(generate_new_features(input_filepath, columns, SCORING_OUTPUT_FILEPATH), columns)
+
+    fraud_column = list(artifact.clf.classes_).index(1)
+    with instrumentation.stage('predict', len(processed_data)) as stage:
+        probabilities = tree_inference.CompiledTree(artifact.clf).predict_proba(model_artifacts.model_matrix(artifact, processed_data))
+        stage.output(probabilities)
+    scores = processed_data[['cc_num', 'trans_date_trans_time']].copy()
+    scores['fraud_probability'] = probabilities[:, fraud_column]
+    with instrumentation.stage('write_scores', len(scores)):
+        storage.write_features(scores, output_filepath)
+    print(f"Scores saved to {output_filepath}")
+    return output_filepath
+
+def compare_sampling(negative_rate: float = sampling.NEGATIVE_RATE, stratify: str = None,
+                     input_filepath: str = feature_gen.INPUT_FILEPATH, test_filepath: str = TEST_FILEPATH,
+                     features: list = FEATURES, max_depth: int = MAX_DEPTH) -> pd.DataFrame:
+    """
+    Train on all rows and on a downsampled training set, and compare both on the test transactions.
+
+    The training matrix is written once and each training, sampling included, runs in a new
+    process with memory tracking. So the peak resident memory growth of a training is not hidden
+    by an earlier, larger peak of this process, and the peak of the memory traced by tracemalloc
+    gives the NumPy buffers it allocated. The models are compared without being saved.
+
+    Args:
+        negative_rate (float): The share of legitimate transactions of the downsampled training set.
+        stratify (str): Sample per 'card' or per 'time' period, or None.
+        input_filepath (str): The path to the raw training transactions.
+        test_filepath (str): The path to the raw test transactions.
+        features (list): The feature columns to train on.
+        max_depth (int): Maximum depth of the decision tree.
+
+    Returns:
+        pd.DataFrame: Per training set, the rows fitted, the training and fit times, the peak
+            resident and traced memory growth of the training, and the PR-AUC, precision and
+            recall on the test set at the decision threshold.
+    """
+    strata_columns = [] if stratify is None else [sampling.STRATA_COLUMNS[stratify]]
+    training_data = generate_new_features(input_filepath, features + ['is_fraud'] + strata_columns)
+    with instrumentation.stage('feature_matrix') as stage:
+        training_matrix = feature_store.write_feature_matrix(training_data, features, sort_by_time=False,
+                                                             strata_columns=strata_columns)
+        stage.output(training_matrix.X)
+    vocabulary = CategoryVocabulary(training_matrix.schema['categories'])
+    test_data = generate_new_features(test_filepath, features + ['is_fraud'], TEST_OUTPUT_FILEPATH)
+
+    rows = []
+    for name, rate in (('full', None), (f"sampled {negative_rate:g}", negative_rate)):
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            clf, summary, records = pool.submit(_fit_with_memory_tracking, features, max_depth, rate,
+                                                stratify if rate is not None else None, feature_store.STORE_DIR).result()
+        training, fit = (next(record for record in records if record['stage'] == stage) for stage in ('train', 'fit'))
+        metadata = {'training_data': input_filepath, 'rows': training_matrix.schema['rows'], 'max_depth': max_depth}
+        if summary is not None:
+            metadata['sampling'] = summary
+        metrics = evaluation.evaluate_chunked(model_artifacts.ModelArtifact(clf, features, vocabulary, metadata), test_data)
+        at_threshold = metrics.threshold_table().set_index('threshold').loc[evaluation.DECISION_THRESHOLD]
+        rows.append({
+            'training_set': name,
+            'fit_rows': fit['rows_in'],
+            'train_seconds': training['wall_seconds'],
+            'fit_seconds': fit['wall_seconds'],
+            'peak_rss_growth_bytes': training['peak_rss_growth_bytes'],
+            'peak_traced_bytes': training['peak_traced_bytes'],
+            'pr_auc': metrics.pr_auc(),
+            'precision': at_threshold['precision'],
+            'recall': at_threshold['recall'],
+        })
+    comparison = pd.DataFrame(rows)
+    print(comparison.to_string(index=False))
+    return comparison
+
+def main(argv: list = None) -> None:
+    """
+    Main function for training & testing dataset.
+
+    'train' trains the Decision Tree Classifier on the training transactions and saves it as
+    a new model version, 'evaluate' evaluates a saved model on the test transactions and
+    'score' scores raw transactions with a saved model, neither of them retraining. Without
+    a command, a new model is trained and then evaluated. The timings of every stage are
+    saved as a Chrome trace.
+
+    Args:
+        argv (list): The command line arguments, or None for sys.argv.
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Train, evaluate and apply the fraud detection model.")
+    commands = parser.add_subparsers(dest='command')
+    train_parser = commands.add_parser('train', help="Train and save a new model version")
+    train_parser.add_argument('--input', default=feature_gen.INPUT_FILEPATH, help="Raw training transactions")
+    train_parser.add_argument('--max-depth', type=int, default=MAX_DEPTH)
+    train_parser.add_argument('--negative-rate', type=float, help="Train on this share of the legitimate transactions")
+    train_parser.add_argument('--stratify', choices=list(sampling.STRATA_COLUMNS), help="Sample per card or per time period")
+    evaluate_parser = commands.add_parser('evaluate', help="Evaluate a saved model on test transactions")
+    evaluate_parser.add_argument('--model', help="The model artifact, default the latest saved model")
+    evaluate_parser.add_argument('--test', default=TEST_FILEPATH, help="Raw test transactions")
+    score_parser = commands.add_parser('score', help="Score raw transactions with a saved model")
+    score_parser.add_argument('input', help="Raw transactions to score")
+    score_parser.add_argument('--model', help="The model artifact, default the latest saved model")
+    score_parser.add_argument('--output', default=SCORES_FILEPATH, help="Where to save the scores")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'train':
+            train(args.input, max_depth=args.max_depth, negative_rate=args.negative_rate, stratify=args.stratify)
+        elif args.command == 'evaluate':
+            evaluate(args.model, args.test)
+        elif args.command == 'score':
+            score(args.input, args.output, args.model)
+        else:
+            evaluate(train())
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    instrumentation.current().write_chrome_trace(instrumentation.TRACE_FILEPATH)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,113 @@
+import os
+from collections import namedtuple
+from datetime import datetime
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from category_vocabulary import CategoryVocabulary
+
+# Constants
+MODELS_DIR = 'assets/models'
+# Holds the file name of the most recently saved model
+LATEST_FILENAME = 'LATEST'
+# Bump when the saved layout changes; older artifacts are then rejected instead of misread
+ARTIFACT_FORMAT_VERSION = 1
+
+# Everything needed to score raw feature tables: the classifier, its feature columns in order,
+# the CategoryVocabulary of the encoded columns and free-form metadata
+ModelArtifact = namedtuple('ModelArtifact', ['clf', 'features', 'vocabulary', 'metadata'])
+
+def save_model(artifact: ModelArtifact, models_dir: str = MODELS_DIR) -> str:
+    """
+    Save a model artifact as a new version and mark it as the latest one.
+
+    Args:
+        artifact (ModelArtifact): The model to save.
+        models_dir (str): The directory holding all model versions.
+
+    Returns:
+        str: The path of the saved artifact.
+    """
+    os.makedirs(models_dir, exist_ok=True)
+    version = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    file_name = f"model-{version}.joblib"
+    payload = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'version': version,
+        'sklearn_version': sklearn.__version__,
+        'clf': artifact.clf,
+        'features': list(artifact.features),
+        'categories': artifact.vocabulary.categories,
+        'metadata': artifact.metadata,
+    }
+    joblib.dump(payload, os.path.join(models_dir, file_name))
+
+    # Point to the new version only once it is completely written
+    latest_path = os.path.join(models_dir, LATEST_FILENAME)
+    with open(latest_path + '.tmp', 'w') as file:
+        file.write(file_name)
+    os.replace(latest_path + '.tmp', latest_path)
+    print(f"Model saved to {os.path.join(models_dir, file_name)}")
+    return os.path.join(models_dir, file_name)
+
+def latest_model_path(models_dir: str = MODELS_DIR) -> str:
+    """
+    Find the most recently saved model.
+
+    Args:
+        models_dir (str): The directory holding all model versions.
+
+    Returns:
+        str: The path of the latest artifact.
+    """
+    latest_path = os.path.join(models_dir, LATEST_FILENAME)
+    if not os.path.exists(latest_path):
+        raise FileNotFoundError(f"No saved model in {models_dir}, train one first (python main.py train)")
+    with open(latest_path) as file:
+        return os.path.join(models_dir, file.read().strip())
+
+def load_model(model_path: str = None, models_dir: str = MODELS_DIR) -> ModelArtifact:
+    """
+    Load a saved model artifact.
+
+    Args:
+        model_path (str): The artifact to load, or None for the latest one in models_dir.
+        models_dir (str): The directory holding all model versions.
+
+    Returns:
+        ModelArtifact: The model, with the artifact's version and library versions added to its metadata.
+    """
+    model_path = latest_model_path(models_dir) if model_path is None else model_path
+    payload = joblib.load(model_path)
+    if payload.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"{model_path} has artifact format {payload.get('format_version')}, expected {ARTIFACT_FORMAT_VERSION}")
+    if payload['sklearn_version'] != sklearn.__version__:
+        print(f"Warning: {model_path} was saved with scikit-learn {payload['sklearn_version']}, running {sklearn.__version__}")
+    metadata = dict(payload['metadata'], version=payload['version'], sklearn_version=payload['sklearn_version'])
+    return ModelArtifact(payload['clf'], payload['features'], CategoryVocabulary(payload['categories']), metadata)
+
+def model_matrix(artifact: ModelArtifact, data: pd.DataFrame) -> np.ndarray:
+    """
+    Build the float32 feature matrix of a model from a processed feature table.
+
+    Encoded columns use the model's own category vocabulary, so codes match training
+    regardless of which categories the table contains, and unseen ones get UNKNOWN_CODE.
+
+    Args:
+        artifact (ModelArtifact): The model.
+        data (pd.DataFrame): A processed feature table with at least the model's features.
+
+    Returns:
+        np.ndarray: A C-contiguous float32 matrix with the model's features in order.
+    """
+    missing = set(artifact.features) - set(data.columns)
+    if missing:
+        raise ValueError(f"Missing features in data: {missing}")
+    X = np.empty((len(data), len(artifact.features)), dtype=np.float32)
+    for position, feature in enumerate(artifact.features):
+        if feature in artifact.vocabulary:
+            X[:, position] = artifact.vocabulary.encode(feature, data[feature])
+        else:
+            X[:, position] = data[feature].to_numpy(dtype=np.float32)
+    return X
@@ -0,0 +1,148 @@
+import time
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.metrics import average_precision_score
+from sklearn.model_selection import ParameterGrid, TimeSeriesSplit
+from sklearn.tree import DecisionTreeClassifier
+import feature_store
+import main
+
+# Constants
+SEARCH_RESULTS_FILEPATH = 'assets/model_search.csv'
+# The search's own feature matrix, apart from the one main.train writes to feature_store.STORE_DIR
+SEARCH_STORE_DIR = 'assets/feature_store/model_search'
+CV_SPLITS = 4
+# None for one worker per CPU
+SEARCH_WORKERS = None
+# Estimators and the parameter grids searched for each of them
+SEARCH_SPACE = [
+    (DecisionTreeClassifier(), {
+        'max_depth': [6, 8, 10, 12, 16, None],
+        'min_samples_leaf': [1, 10, 50],
+        'class_weight': [None, 'balanced'],
+    }),
+    (RandomForestClassifier(n_estimators=100, n_jobs=1), {
+        'max_depth': [10, 16],
+        'min_samples_leaf': [1, 10],
+        'class_weight': [None, 'balanced_subsample'],
+    }),
+    (HistGradientBoostingClassifier(max_iter=200), {
+        'max_depth': [None, 8],
+        'learning_rate': [0.05, 0.1],
+        'class_weight': [None, 'balanced'],
+    }),
+]
+
+def search_candidates(search_space: list = None) -> list:
+    """
+    Expand the search space into unfitted estimators, one per parameter combination.
+
+    Args:
+        search_space (list): (estimator, parameter grid) pairs, or None for SEARCH_SPACE.
+
+    Returns:
+        list: The candidate estimators.
+    """
+    candidates = []
+    for estimator, grid in SEARCH_SPACE if search_space is None else search_space:
+        for params in ParameterGrid(grid):
+            candidates.append(clone(estimator).set_params(**params))
+    return candidates
+
+def _changed_params(estimator) -> dict:
+    # The parameters that differ from the estimator's defaults, to keep the report short
+    defaults = type(estimator)().get_params(deep=False)
+    return {name: value for name, value in estimator.get_params(deep=False).items() if value != defaults.get(name)}
+
+def _fit_and_score(estimator, X: np.ndarray, y: np.ndarray, train: slice, test: slice) -> tuple:
+    # One candidate on one fold; X and y are memory-mapped from the parent process, and the
+    # folds are contiguous row ranges, so the slices are views rather than copies
+    start = time.perf_counter()
+    estimator.fit(X[train], y[train])
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    classes = list(estimator.classes_)
+    # A training range without any fraud gives a single-class model
+    scores = estimator.predict_proba(X[test])[:, classes.index(1)] if 1 in classes else np.zeros(len(y[test]))
+    predict_seconds = time.perf_counter() - start
+    pr_auc = average_precision_score(y[test], scores) if y[test].any() else np.nan
+    return pr_auc, fit_seconds, predict_seconds
+
+def search(X: np.ndarray, y: np.ndarray, candidates: list = None, n_splits: int = CV_SPLITS, workers: int = SEARCH_WORKERS) -> pd.DataFrame:
+    """
+    Cross-validate every candidate in parallel with expanding time-ordered folds.
+
+    Every fold trains on the rows before its test rows, so no model is scored on transactions
+    older than the ones it was trained on. All (candidate, fold) fits run in one pool of
+    worker processes, which share X and y through a memory-mapped file instead of receiving
+    a copy each; arrays from the feature store are passed on as the files they already are.
+
+    Args:
+        X (np.ndarray): The feature matrix, with rows ordered by transaction time.
+        y (np.ndarray): The fraud labels.
+        candidates (list): Unfitted estimators, or None for search_candidates().
+        n_splits (int): The number of time-based folds.
+        workers (int): The number of worker processes, or None for one per CPU.
+
+    Returns:
+        pd.DataFrame: One row per candidate with its mean and standard deviation of PR-AUC
+            (average precision) and its mean fit and predict time, best first.
+    """
+    candidates = search_candidates() if candidates is None else candidates
+    folds = [(slice(train[0], train[-1] + 1), slice(test[0], test[-1] + 1))
+             for train, test in TimeSeriesSplit(n_splits=n_splits).split(X)]
+    tasks = [(index, fold) for index in range(len(candidates)) for fold in range(len(folds))]
+
+    parallel = Parallel(n_jobs=workers or -1, max_nbytes='1M', mmap_mode='r', verbose=5)
+    scores = parallel(delayed(_fit_and_score)(clone(candidates[index]), X, y, *folds[fold]) for index, fold in tasks)
+
+    rows = []
+    for index, estimator in enumerate(candidates):
+        results = np.array([score for (task_index, _), score in zip(tasks, scores) if task_index == index])
+        rows.append({
+            'model': type(estimator).__name__,
+            'params': _changed_params(estimator),
+            'pr_auc': np.nanmean(results[:, 0]),
+            'pr_auc_std': np.nanstd(results[:, 0]),
+            'fit_seconds': results[:, 1].mean(),
+            'predict_seconds': results[:, 2].mean(),
+        })
+    return pd.DataFrame(rows).sort_values('pr_auc', ascending=False, ignore_index=True)
+
+def load_training_matrix(file_path: str, features: list = main.FEATURES, store_dir: str = SEARCH_STORE_DIR) -> tuple:
+    """
+    Materialize the cleaned training features once, ordered by transaction time for the time-based folds.
+
+    Args:
+        file_path (str): The processed feature table.
+        features (list): The feature columns.
+        store_dir (str): The feature store directory to write the matrix to.
+
+    Returns:
+        tuple: The memory-mapped C-contiguous float32 feature matrix and int8 label vector.
+    """
+    matrix = feature_store.write_feature_matrix(file_path, features, store_dir)
+    return matrix.X, matrix.y
+
+def main_search() -> None:
+    """
+    Run the full model search on the training data and save the results.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    training_data = main.generate_new_features(features=main.FEATURES + ['is_fraud', 'trans_date_trans_time'])
+    X, y = load_training_matrix(training_data)
+    results = search(X, y)
+    results.to_csv(SEARCH_RESULTS_FILEPATH, index=False)
+    print(results.to_string())
+    print(f"Search results saved to {SEARCH_RESULTS_FILEPATH}")
+
+if __name__ == '__main__':
+    main_search()
@@ -0,0 +1,114 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import feature_store
+import instrumentation
+
+# Constants
+# Share of the legitimate transactions kept for training; every fraudulent one is kept
+NEGATIVE_RATE = 0.05
+SAMPLE_CHUNK_ROWS = 1_000_000
+SAMPLE_SEED = 0
+# The stored strata column behind each way of stratifying
+STRATA_COLUMNS = {'card': 'cc_num', 'time': feature_store.TIME_COLUMN}
+# Length of the time strata
+TIME_STRATUM = '7D'
+# Strata with few legitimate transactions keep at least this many of them, or all
+MIN_STRATUM_NEGATIVES = 20
+
+# X is the C-contiguous float32 matrix of the kept rows, y their labels and sample_weight the
+# importance weight of every kept row for fit(sample_weight=...)
+TrainingSample = namedtuple('TrainingSample', ['X', 'y', 'sample_weight', 'summary'])
+
+def stratum_keys(values: np.ndarray, stratify: str) -> np.ndarray:
+    """
+    Map stored strata values to the stratum of every row.
+
+    Args:
+        values (np.ndarray): The int64 values of the strata column, see feature_store.load_strata.
+        stratify (str): 'card' for one stratum per card or 'time' for one per TIME_STRATUM.
+
+    Returns:
+        np.ndarray: The int64 stratum of every row.
+    """
+    if stratify == 'card':
+        return values
+    if stratify == 'time':
+        return values // pd.Timedelta(TIME_STRATUM).value
+    raise ValueError(f"Unknown stratification {stratify}, expected one of {list(STRATA_COLUMNS)}")
+
+def downsample(matrix: feature_store.FeatureMatrix, negative_rate: float = NEGATIVE_RATE, strata: np.ndarray = None,
+               stratify: str = None, chunk_rows: int = SAMPLE_CHUNK_ROWS, seed: int = SAMPLE_SEED) -> TrainingSample:
+    """
+    Keep every fraudulent row and a random share of the legitimate ones of a stored feature matrix.
+
+    The matrix is read chunk by chunk, so only the kept rows are ever in memory. Each kept
+    legitimate row is weighted by the number of legitimate rows of its stratum over the number
+    kept, so the weighted class counts equal the full data's in every stratum and a weighted
+    tree estimates the same fraud probabilities. With strata, a first pass over the labels and
+    strata counts the legitimate rows of each stratum, and small strata are sampled at a higher
+    rate so none of them is left out.
+
+    Args:
+        matrix (FeatureMatrix): The stored training matrix, usually memory-mapped.
+        negative_rate (float): The share of legitimate rows to keep.
+        strata (np.ndarray): The stored strata column in matrix row order (see
+            feature_store.load_strata), or None to sample all rows alike.
+        stratify (str): How the strata values are grouped, see stratum_keys.
+        chunk_rows (int): The number of rows read at a time.
+        seed (int): The seed of the random sample.
+
+    Returns:
+        TrainingSample: The kept rows, their labels and weights, and a summary of the sample.
+    """
+    if not 0 < negative_rate <= 1:
+        raise ValueError(f"negative_rate must be in (0, 1], got {negative_rate}")
+    rows = len(matrix.y)
+    chunks = [slice(start, min(start + chunk_rows, rows)) for start in range(0, rows, chunk_rows)]
+
+    def keys(chunk: slice) -> np.ndarray:
+        return np.zeros(chunk.stop - chunk.start, dtype=np.int64) if strata is None else stratum_keys(np.asarray(strata[chunk]), stratify)
+
+    with instrumentation.stage('sample', rows) as stage:
+        negatives = pd.Series(dtype=np.int64)
+        if strata is not None:
+            for chunk in chunks:
+                negatives = negatives.add(pd.Series(keys(chunk)[np.asarray(matrix.y[chunk]) == 0]).value_counts(), fill_value=0)
+            # Keep at least MIN_STRATUM_NEGATIVES rows of every stratum on average
+            rates = np.minimum(1.0, np.maximum(negative_rate, MIN_STRATUM_NEGATIVES / negatives))
+
+        rng = np.random.default_rng(seed)
+        parts = []
+        for chunk in chunks:
+            y = np.asarray(matrix.y[chunk])
+            chunk_keys = keys(chunk)
+            if strata is None:
+                negatives = negatives.add(pd.Series({0: np.count_nonzero(y == 0)}), fill_value=0)
+                threshold = negative_rate
+            else:
+                threshold = rates.reindex(chunk_keys).to_numpy()
+            kept = np.flatnonzero((y == 1) | (rng.random(len(y)) < threshold))
+            parts.append((np.asarray(matrix.X[chunk][kept]), y[kept], chunk_keys[kept]))
+
+        X = np.ascontiguousarray(np.concatenate([part[0] for part in parts]), dtype=np.float32)
+        y = np.concatenate([part[1] for part in parts])
+        kept_keys = pd.Series(np.concatenate([part[2] for part in parts]))
+        legitimate = (y == 0)
+        kept_negatives = kept_keys[legitimate].value_counts()
+        sample_weight = np.ones(len(y), dtype=np.float64)
+        sample_weight[legitimate] = kept_keys[legitimate].map(negatives / kept_negatives).to_numpy()
+        stage.output(X)
+
+    summary = {
+        'rows': rows,
+        'sampled_rows': len(y),
+        'fraud_rows': int(np.count_nonzero(y == 1)),
+        'negative_rate': negative_rate,
+        'stratify': stratify,
+        'strata': len(negatives),
+        # Legitimate rows of strata of which none were drawn, missing from the weighted counts
+        'unrepresented_rows': int(negatives.drop(kept_negatives.index).sum()),
+        'seed': seed,
+    }
+    print(f"Sampled {summary['sampled_rows']} of {rows} rows, keeping {summary['fraud_rows']} fraudulent ones")
+    return TrainingSample(X, y, sample_weight, summary)
@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from sklearn.tree import DecisionTreeClassifier
+import card_state
+import feature_gen
+from category_vocabulary import CategoryVocabulary
+import model_artifacts
+import tree_inference
+from main import train
+
+# Constants
+HOST = '127.0.0.1'
+PORT = 8765
+EPOCH = datetime(1970, 1, 1)
+
+def to_nanoseconds(value) -> int:
+    """
+    Convert a transaction time to nanoseconds since the epoch.
+
+    Args:
+        value: An int (already in nanoseconds), an ISO formatted string such as
+            '2019-01-01 00:00:18', a datetime or a pd.Timestamp.
+
+    Returns:
+        int: The time in nanoseconds since the epoch.
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, pd.Timestamp):
+        return value.value
+    return (value - EPOCH) // timedelta(microseconds=1) * 1000
+
+class FraudScorer:
+    """
+    Score single raw transactions as they arrive.
+
+    Keeps the running state of every card in memory and computes the same features as
+    feature_gen for each new transaction, then walks the compiled classifier on them without
+    any pandas or scikit-learn input validation. Transactions of a card must arrive in time
+    order. The window features are those of the time_frame window. 'total_transactions' counts a card's whole file, including later transactions,
+    so it cannot be served; "transactions to date" is its point-in-time counterpart.
+    """
+
+    def __init__(self, clf: DecisionTreeClassifier, features: list, vocabulary: CategoryVocabulary, time_frame: str = feature_gen.TIME_FRAME) -> None:
+        unknown = set(features) - set(self.online_features(time_frame))
+        if unknown:
+            raise ValueError(f"Features not available for online scoring: {unknown}")
+        self.clf = clf
+        self.compiled = tree_inference.CompiledTree(clf)
+        self.features = list(features)
+        self.vocabulary = vocabulary
+        self.cards = card_state.CardStateStore(time_frame)
+        self.window_columns = {aggregate: feature_gen.ROLLING_COLUMN_NAMES[aggregate].format(window=feature_gen.window_label(time_frame))
+                               for aggregate in ('mean', 'max')}
+        self.fraud_column = list(clf.classes_).index(1)
+        self._row = np.zeros((1, len(features)), dtype=np.float32)
+
+    @staticmethod
+    def online_features(time_frame: str = feature_gen.TIME_FRAME) -> list:
+        """
+        List the feature columns that can be computed from a single transaction and the card state.
+
+        Args:
+            time_frame (str): The length of the card window, as a pandas offset string.
+
+        Returns:
+            list: The feature column names.
+        """
+        window = feature_gen.window_label(time_frame)
+        return ['category', 'amt', 'city_pop', 'trans_year', 'trans_month', 'trans_day', 'trans_hour',
+                'trans_dayofweek', 'is_weekend', 'is_night', 'age', 'time_since_last_purchase',
+                feature_gen.ROLLING_COLUMN_NAMES['mean'].format(window=window),
+                feature_gen.ROLLING_COLUMN_NAMES['max'].format(window=window)] + list(feature_gen.CUMULATIVE_COLUMN_NAMES.values())
+
+    def compute_features(self, transaction: dict) -> dict:
+        """
+        Update the card state with a raw transaction and return its features.
+
+        Args:
+            transaction (dict): A raw transaction with at least 'cc_num', 'trans_date_trans_time',
+                'amt', 'category' and 'city_pop', and 'dob' for the age.
+
+        Returns:
+            dict: The value of every online feature; 'time_since_last_purchase' is in seconds
+                and 'age' is NaN without a 'dob'.
+        """
+        # Read every field before touching the card state, so a malformed transaction leaves no trace
+        cc_num = int(transaction['cc_num'])
+        time = to_nanoseconds(transaction['trans_date_trans_time'])
+        amount = float(transaction['amt'])
+        category = self.vocabulary.encode_one('category', transaction['category'])
+        city_pop = float(transaction['city_pop'])
+        timestamp = EPOCH + timedelta(microseconds=time // 1000)
+        age = np.nan
+        if transaction.get('dob') is not None:
+            dob = pd.Timestamp(transaction['dob'])
+            age = timestamp.year - dob.year - ((timestamp.month, timestamp.day) < (dob.month, dob.day))
+        since_last, count, window_mean, window_max, mean_to_date, max_to_date = self.cards.update(cc_num, time, amount)
+        return {
+            'category': category,
+            'amt': amount,
+            'city_pop': city_pop,
+            'trans_year': timestamp.year,
+            'trans_month': timestamp.month,
+            'trans_day': timestamp.day,
+            'trans_hour': timestamp.hour,
+            'trans_dayofweek': timestamp.weekday(),
+            'is_weekend': int(timestamp.weekday() >= 5),
+            'is_night': int(timestamp.hour >= feature_gen.NIGHT_START_HOUR or timestamp.hour < feature_gen.NIGHT_END_HOUR),
+            'age': age,
+            'time_since_last_purchase': np.nan if since_last is None else since_last / 1e9,
+            self.window_columns['mean']: window_mean,
+            self.window_columns['max']: window_max,
+            feature_gen.CUMULATIVE_COLUMN_NAMES['count']: count,
+            feature_gen.CUMULATIVE_COLUMN_NAMES['mean']: mean_to_date,
+            feature_gen.CUMULATIVE_COLUMN_NAMES['max']: max_to_date,
+        }
+
+    def score(self, transaction: dict) -> float:
+        """
+        Update the card state with a raw transaction and return its fraud probability.
+
+        Args:
+            transaction (dict): A raw transaction, see compute_features.
+
+        Returns:
+            float: The predicted probability that the transaction is fraudulent.
+        """
+        values = self.compute_features(transaction)
+        row = self._row
+        for i, feature in enumerate(self.features):
+            row[0, i] = values[feature]
+        # Round through the float32 row so thresholds compare exactly as in sklearn
+        return float(self.compiled.predict_proba_one(row[0].tolist())[self.fraud_column])
+
+async def handle_client(scorer: FraudScorer, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """
+    Answer one connection: every line is a JSON transaction, every reply a JSON line.
+
+    Args:
+        scorer (FraudScorer): The scorer shared by all connections.
+        reader (asyncio.StreamReader): The connection's input stream.
+        writer (asyncio.StreamWriter): The connection's output stream.
+
+    Returns:
+        None
+    """
+    try:
+        while line := await reader.readline():
+            try:
+                reply = {'probability': scorer.score(json.loads(line))}
+            except (ValueError, KeyError, TypeError) as e:
+                reply = {'error': f"{type(e).__name__}: {e}"}
+            writer.write(json.dumps(reply).encode() + b'\n')
+            await writer.drain()
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+async def serve(scorer: FraudScorer, host: str = HOST, port: int = PORT) -> asyncio.Server:
+    """
+    Start the newline-delimited JSON scoring server.
+
+    Args:
+        scorer (FraudScorer): The scorer answering the requests.
+        host (str): The address to listen on.
+        port (int): The port to listen on; 0 picks a free one.
+
+    Returns:
+        asyncio.Server: The running server.
+    """
+    return await asyncio.start_server(lambda reader, writer: handle_client(scorer, reader, writer), host, port)
+
+async def score_remote(transactions: list, host: str = HOST, port: int = PORT) -> list:
+    """
+    Send transactions to a running scoring server over one connection and collect the replies.
+
+    Args:
+        transactions (list): The raw transactions as dicts.
+        host (str): The server address.
+        port (int): The server port.
+
+    Returns:
+        list: One reply dict per transaction.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    replies = []
+    try:
+        for transaction in transactions:
+            writer.write(json.dumps(transaction, default=str).encode() + b'\n')
+            await writer.drain()
+            replies.append(json.loads(await reader.readline()))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return replies
+
+def build_scorer(model_path: str = None, train_if_missing: bool = False) -> FraudScorer:
+    """
+    Load a saved model and wrap it in a FraudScorer.
+
+    Args:
+        model_path (str): The model artifact, or None for the latest saved model.
+        train_if_missing (bool): Train and save a model first if none was saved yet, rather
+            than raising FileNotFoundError.
+
+    Returns:
+        FraudScorer: A scorer with empty card state.
+    """
+    if model_path is None and train_if_missing and not os.path.exists(os.path.join(model_artifacts.MODELS_DIR, model_artifacts.LATEST_FILENAME)):
+        model_path = train()
+    artifact = model_artifacts.load_model(model_path)
+    return FraudScorer(artifact.clf, artifact.features, artifact.vocabulary)
+
+async def run_server(model_path: str = None, train_if_missing: bool = False) -> None:
+    """
+    Serve a freshly built scorer until interrupted.
+
+    Args:
+        model_path (str): The model artifact, or None for the latest saved model.
+        train_if_missing (bool): Train a model first if none was saved yet, see build_scorer.
+
+    Returns:
+        None
+    """
+    server = await serve(build_scorer(model_path, train_if_missing))
+    print(f"Scoring transactions on {HOST}:{PORT}")
+    async with server:
+        await server.serve_forever()
+
+def main(argv: list = None) -> None:
+    """
+    Main function for the online scoring service.
+
+    Args:
+        argv (list): The command line arguments, or None for sys.argv.
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Score single transactions sent as JSON lines.")
+    parser.add_argument('--model', help="The model artifact, default the latest saved model")
+    parser.add_argument('--train-if-missing', action='store_true', help="Train a model first if none was saved yet")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(run_server(args.model, args.train_if_missing))
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import os
+import pandas as pd
+import ingest
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Constants
+FORMATS = ('feather', 'parquet', 'csv')
+EXTENSIONS = {'.feather': 'feather', '.arrow': 'feather', '.parquet': 'parquet', '.csv': 'csv'}
+# Compressed Arrow buffers have to be decompressed into new memory, which defeats the memory
+# map, so the Feather cache is stored uncompressed. Parquet is compressed for archiving.
+FEATHER_COMPRESSION = 'uncompressed'
+PARQUET_COMPRESSION = 'zstd'
+
+def format_from_path(file_path: str) -> str:
+    """
+    Infer the storage format of a feature table from its file extension.
+
+    Args:
+        file_path (str): The path to the feature table.
+
+    Returns:
+        str: One of FORMATS.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise ValueError(f"Unknown feature table format for {file_path}, expected one of {list(EXTENSIONS)}")
+    file_format = EXTENSIONS[extension]
+    if file_format != 'csv' and pa is None:
+        raise ImportError(f"pyarrow is required to use {file_format} files")
+    return file_format
+
+def _to_arrow(df: pd.DataFrame, schema=None):
+    # Feature tables never store the pandas index, it only reflects the sort order.
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+def write_features(df: pd.DataFrame, file_path: str) -> None:
+    """
+    Save a feature table in the format given by its file extension.
+
+    Args:
+        df (pd.DataFrame): The feature table.
+        file_path (str): The output path; '.feather'/'.arrow', '.parquet' or '.csv'.
+
+    Returns:
+        None
+    """
+    file_format = format_from_path(file_path)
+    if file_format == 'feather':
+        feather.write_feather(_to_arrow(df), file_path, compression=FEATHER_COMPRESSION)
+    elif file_format == 'parquet':
+        pq.write_table(_to_arrow(df), file_path, compression=PARQUET_COMPRESSION)
+    else:
+        df.to_csv(file_path, index=False)
+
+def read_features(file_path: str, columns: list = None) -> pd.DataFrame:
+    """
+    Load a feature table, reading only the requested columns.
+
+    Feather files are opened through a memory map, so numeric columns without missing
+    values are handed to pandas without being copied.
+
+    Args:
+        file_path (str): The path to the feature table.
+        columns (list): The columns to load, or None for all of them.
+
+    Returns:
+        pd.DataFrame: The feature table.
+    """
+    file_format = format_from_path(file_path)
+    if file_format == 'feather':
+        table = feather.read_table(file_path, columns=columns, memory_map=True)
+    elif file_format == 'parquet':
+        table = pq.read_table(file_path, columns=columns, memory_map=True)
+    else:
+        return ingest.read_transactions(file_path, columns)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def iter_features(file_path: str, batch_rows: int, columns: list = None):
+    """
+    Read a feature table in batches, so only one batch is in memory at a time.
+
+    Args:
+        file_path (str): The path to the feature table.
+        batch_rows (int): The maximum number of rows per batch.
+        columns (list): The columns to load, or None for all of them.
+
+    Yields:
+        pd.DataFrame: The rows of each batch, in file order.
+    """
+    file_format = format_from_path(file_path)
+    if file_format == 'csv':
+        yield from ingest.iter_transactions(file_path, batch_rows, columns)
+        return
+    dataset = ds.dataset(file_path, format='ipc' if file_format == 'feather' else 'parquet')
+    for batch in dataset.to_batches(columns=columns, batch_size=batch_rows):
+        yield batch.to_pandas()
+
+def export_features(input_filepath: str, output_filepath: str, columns: list = None) -> None:
+    """
+    Convert a feature table to another format, e.g. export the Feather cache as CSV.
+
+    Args:
+        input_filepath (str): The path to the existing feature table.
+        output_filepath (str): The path of the converted table; its extension selects the format.
+        columns (list): The columns to export, or None for all of them.
+
+    Returns:
+        None
+    """
+    write_features(read_features(input_filepath, columns), output_filepath)
+
+class FeatureWriter:
+    """
+    Append feature tables chunk by chunk to a single file.
+
+    The schema is taken from the first chunk; later chunks are cast to it. Use as a
+    context manager so the file footer is written when the last chunk is done.
+    """
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self.file_format = format_from_path(file_path)
+        self._schema = None
+        self._writer = None
+        self._rows_written = 0
+
+    def write(self, df: pd.DataFrame) -> None:
+        """
+        Append one chunk of rows.
+
+        Args:
+            df (pd.DataFrame): The chunk to append.
+
+        Returns:
+            None
+        """
+        first = self._rows_written == 0
+        self._rows_written += len(df)
+        # Every chunk has its own categories, and an Arrow file cannot replace a dictionary midway
+        categorical = df.select_dtypes('category').columns
+        if len(categorical):
+            df = df.astype({column: df[column].cat.categories.dtype for column in categorical})
+        if self.file_format == 'csv':
+            df.to_csv(self.file_path, index=False, mode='w' if first else 'a', header=first)
+            return
+
+        table = _to_arrow(df, self._schema)
+        if self._writer is None:
+            self._schema = table.schema
+            if self.file_format == 'feather':
+                options = pa.ipc.IpcWriteOptions(compression=None if FEATHER_COMPRESSION == 'uncompressed' else FEATHER_COMPRESSION)
+                self._writer = pa.ipc.new_file(self.file_path, self._schema, options=options)
+            else:
+                self._writer = pq.ParquetWriter(self.file_path, self._schema, compression=PARQUET_COMPRESSION)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        """
+        Finish the file.
+
+        Returns:
+            None
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self) -> 'FeatureWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+# Constants
+CATEGORIES = ['entertainment', 'food_dining', 'gas_transport', 'grocery_net', 'grocery_pos', 'health_fitness', 'home',
+              'kids_pets', 'misc_net', 'misc_pos', 'personal_care', 'shopping_net', 'shopping_pos', 'travel']
+STATES = ['AL', 'AZ', 'CA', 'CO', 'FL', 'GA', 'IL', 'MI', 'MN', 'MO', 'NC', 'NY', 'OH', 'PA', 'TX', 'VA', 'WA', 'WI']
+FIRST_NAMES = ['Jennifer', 'Stephanie', 'Edward', 'Jeremy', 'Tyler', 'Jessica', 'Daniel', 'Mary', 'Robert', 'Linda']
+LAST_NAMES = ['Banks', 'Gill', 'Sanchez', 'White', 'Garcia', 'Smith', 'Johnson', 'Williams', 'Brown', 'Jones']
+JOBS = ['Psychologist, counselling', 'Special educational needs teacher', 'Nature conservation officer',
+        'Patent attorney', 'Dance movement psychotherapist', 'Transport planner', 'Systems developer', 'Engineer, civil']
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def generate_transactions(rows: int, cards: int, fraud_rate: float = 0.006, start: str = '2019-01-01',
+                          end: str = '2020-06-21', merchants: int = 693, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate synthetic transactions with the columns and value formats of fraudTrain.csv.
+
+    Card holder attributes are fixed per card, merchants sit near their customers, and
+    fraudulent transactions are larger and more often at night, so the feature and training
+    pipeline sees realistic shapes. Rows are sorted by transaction time like the Kaggle files.
+
+    Args:
+        rows (int): The number of transactions.
+        cards (int): The number of distinct cards.
+        fraud_rate (float): The fraction of fraudulent transactions.
+        start (str): The first possible transaction date.
+        end (str): The last possible transaction date.
+        merchants (int): The number of distinct merchants.
+        seed (int): The random seed.
+
+    Returns:
+        pd.DataFrame: The transactions, in the fraudTrain.csv column order.
+    """
+    rng = np.random.default_rng(seed)
+
+    # Card holders
+    cc_nums = rng.choice(np.arange(10 ** 15, 10 ** 15 + 100 * cards, 100), size=cards, replace=False) + rng.integers(0, 100, cards)
+    home_lat = rng.uniform(25.0, 48.0, cards)
+    home_long = rng.uniform(-123.0, -70.0, cards)
+    birth_days = rng.integers(0, 365 * 70, cards)
+    dobs = (pd.Timestamp('1935-01-01') + pd.to_timedelta(birth_days, unit='D')).strftime('%Y-%m-%d')
+    card_weights = rng.pareto(2.0, cards) + 1.0
+
+    # Transactions, with busier cards getting more of them
+    card = rng.choice(cards, size=rows, p=card_weights / card_weights.sum())
+    first = pd.Timestamp(start).value // 10 ** 9
+    last = pd.Timestamp(end).value // 10 ** 9
+    unix_time = np.sort(rng.integers(first, last, rows))
+    is_fraud = (rng.random(rows) < fraud_rate).astype(np.int8)
+
+    category = rng.integers(0, len(CATEGORIES), rows)
+    category_scale = np.linspace(20.0, 120.0, len(CATEGORIES))[category]
+    amt = np.round(rng.lognormal(0.0, 0.8, rows) * category_scale * np.where(is_fraud == 1, 5.0, 1.0), 2)
+    # Most fraud happens late at night
+    night_shift = np.where(is_fraud == 1, (22 * 3600 - unix_time % 86400 + rng.integers(0, 4 * 3600, rows)) % 86400, 0)
+    unix_time = unix_time + night_shift
+    order = np.argsort(unix_time, kind='stable')
+    card, unix_time, is_fraud, category, amt = card[order], unix_time[order], is_fraud[order], category[order], amt[order]
+
+    times = pd.to_datetime(unix_time, unit='s')
+    return pd.DataFrame({
+        'trans_date_trans_time': times.strftime(DATE_FORMAT),
+        'cc_num': cc_nums[card],
+        'merchant': np.char.add('fraud_Merchant ', rng.integers(0, merchants, rows).astype(str)),
+        'category': np.array(CATEGORIES)[category],
+        'amt': amt,
+        'first': np.array(FIRST_NAMES)[cc_nums[card] % len(FIRST_NAMES)],
+        'last': np.array(LAST_NAMES)[cc_nums[card] // 7 % len(LAST_NAMES)],
+        'gender': np.where(cc_nums[card] % 2 == 0, 'F', 'M'),
+        'street': np.char.add(((cc_nums[card] // 3) % 9999).astype(str), ' Main Street'),
+        'city': np.char.add('City ', (card % 500).astype(str)),
+        'state': np.array(STATES)[card % len(STATES)],
+        'zip': 10000 + (card * 37) % 89999,
+        'lat': np.round(home_lat[card], 4),
+        'long': np.round(home_long[card], 4),
+        'city_pop': (card * 7919) % 2_000_000 + 100,
+        'job': np.array(JOBS)[card % len(JOBS)],
+        'dob': np.asarray(dobs)[card],
+        'trans_num': np.frombuffer(rng.bytes(16 * rows).hex().encode(), dtype='S32').astype(str),
+        'unix_time': unix_time,
+        'merch_lat': np.round(home_lat[card] + rng.uniform(-1.0, 1.0, rows), 6),
+        'merch_long': np.round(home_long[card] + rng.uniform(-1.0, 1.0, rows), 6),
+        'is_fraud': is_fraud,
+    })
+
+def write_transactions(file_path: str, rows: int, cards: int, **kwargs) -> None:
+    """
+    Generate synthetic transactions and save them as a fraudTrain-style CSV file.
+
+    Args:
+        file_path (str): The output CSV path.
+        rows (int): The number of transactions.
+        cards (int): The number of distinct cards.
+        **kwargs: Further arguments for generate_transactions.
+
+    Returns:
+        None
+    """
+    # The Kaggle files start with an unnamed row number column
+    generate_transactions(rows, cards, **kwargs).to_csv(file_path)
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import model_artifacts
+from category_vocabulary import CategoryVocabulary, UNKNOWN_CODE
+
+def make_vocabulary() -> CategoryVocabulary:
+    train = pd.DataFrame({'category': ['gas', 'food', 'travel', 'food', None]})
+    return CategoryVocabulary.fit(train, ['category'])
+
+def test_codes_match_sorted_training_categories():
+    vocabulary = make_vocabulary()
+    assert vocabulary.categories['category'] == ['food', 'gas', 'travel']
+    codes = vocabulary.encode('category', pd.Series(['travel', 'food', 'gas']))
+    np.testing.assert_array_equal(codes, [2, 0, 1])
+
+def test_unseen_and_missing_categories_encode_to_unknown():
+    vocabulary = make_vocabulary()
+    values = pd.Series(['food', 'pets', None, 'gas', 'toys'])
+    expected = [0, UNKNOWN_CODE, UNKNOWN_CODE, 1, UNKNOWN_CODE]
+    np.testing.assert_array_equal(vocabulary.encode('category', values), expected)
+    np.testing.assert_array_equal(vocabulary.encode('category', values.astype('category')), expected)
+    assert [vocabulary.encode_one('category', value) for value in values] == expected
+
+def test_codes_survive_save_and_load(tmp_path):
+    vocabulary = make_vocabulary()
+    artifact = model_artifacts.ModelArtifact(None, ['category'], vocabulary, {})
+    loaded = model_artifacts.load_model(model_artifacts.save_model(artifact, str(tmp_path))).vocabulary
+    values = pd.Series(['travel', 'pets', 'food', None, 'gas'])
+    assert loaded.categories == vocabulary.categories
+    np.testing.assert_array_equal(loaded.encode('category', values), vocabulary.encode('category', values))
+    assert loaded.encode_one('category', 'pets') == UNKNOWN_CODE
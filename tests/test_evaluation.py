@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import average_precision_score, f1_score, precision_score, recall_score
+from sklearn.tree import DecisionTreeClassifier
+import evaluation
+import model_artifacts
+import storage
+from category_vocabulary import CategoryVocabulary
+
+def make_table(rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    amount = rng.gamma(2.0, 50.0, rows)
+    category = rng.choice(['food', 'gas', 'travel', 'misc'], rows)
+    is_fraud = ((amount > 150) & (category == 'travel')) | (rng.random(rows) < 0.02)
+    return pd.DataFrame({'amt': amount, 'category': category, 'is_fraud': is_fraud.astype(np.int8)})
+
+def make_artifact(train: pd.DataFrame) -> model_artifacts.ModelArtifact:
+    features = ['amt', 'category']
+    vocabulary = CategoryVocabulary.fit(train, ['category'])
+    artifact = model_artifacts.ModelArtifact(None, features, vocabulary, {})
+    clf = DecisionTreeClassifier(max_depth=6, random_state=0)
+    clf.fit(model_artifacts.model_matrix(artifact, train), train['is_fraud'])
+    return artifact._replace(clf=clf)
+
+@pytest.mark.parametrize('batch_rows', [997, 5000, 100000])
+def test_chunked_metrics_match_sklearn_on_whole_table(tmp_path, batch_rows):
+    artifact = make_artifact(make_table(20000, seed=0))
+    test = make_table(30000, seed=1)
+    # Rows with a missing value are skipped in both cases
+    test.loc[test.sample(frac=0.01, random_state=2).index, 'amt'] = np.nan
+    table_filepath = str(tmp_path / 'test.feather')
+    storage.write_features(test, table_filepath)
+
+    metrics = evaluation.evaluate_chunked(artifact, table_filepath, batch_rows=batch_rows)
+
+    test = test.dropna()
+    y_true = test['is_fraud'].to_numpy()
+    scores = artifact.clf.predict_proba(model_artifacts.model_matrix(artifact, test))[:, 1]
+    y_pred = scores > evaluation.DECISION_THRESHOLD
+    (tn, fp), (fn, tp) = metrics.confusion_matrix()
+    precision, recall = tp / (tp + fp), tp / (tp + fn)
+    assert metrics.rows == len(test)
+    assert precision == pytest.approx(precision_score(y_true, y_pred))
+    assert recall == pytest.approx(recall_score(y_true, y_pred))
+    assert 2 * precision * recall / (precision + recall) == pytest.approx(f1_score(y_true, y_pred))
+    assert metrics.pr_auc() == pytest.approx(average_precision_score(y_true, scores))
+
+def test_metrics_do_not_depend_on_batches():
+    test = make_table(5000, seed=3)
+    scores = np.random.default_rng(4).random(len(test)).round(2)
+    whole, batched = evaluation.StreamingMetrics(), evaluation.StreamingMetrics()
+    whole.update(test['is_fraud'], scores)
+    for start in range(0, len(test), 701):
+        batched.update(test['is_fraud'][start:start + 701], scores[start:start + 701])
+    pd.testing.assert_frame_equal(whole.threshold_table(), batched.threshold_table())
+    assert whole.pr_auc() == batched.pr_auc()
@@ -0,0 +1,26 @@
+import os
+import pandas as pd
+import feature_cache
+
+def test_evict_keeps_files_being_written(tmp_path):
+    cache = feature_cache.FeatureCache(str(tmp_path), max_bytes=0)
+    in_flight = tmp_path / 'other.feather.tmp.1234.feather'
+    in_flight.write_bytes(b'partial')
+    cache.store('key', pd.Series([1.0, 2.0], name='column'))
+    # The stored column is over the limit and evicted, another process's temporary file is not
+    assert cache.load('key') is None
+    assert in_flight.exists()
+
+def test_evict_tolerates_files_removed_by_another_process(tmp_path, monkeypatch):
+    cache = feature_cache.FeatureCache(str(tmp_path), max_bytes=0)
+    for key in ('a', 'b'):
+        (tmp_path / f"{key}.feather").write_bytes(b'x' * 10)
+    remove = os.remove
+
+    def remove_twice(path):
+        # Another evictor got there first
+        remove(path)
+        remove(path)
+    monkeypatch.setattr(feature_cache.os, 'remove', remove_twice)
+    cache.evict()
+    assert not any(tmp_path.iterdir())
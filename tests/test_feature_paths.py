@@ -0,0 +1,111 @@
+import pandas as pd
+import pytest
+import feature_cache
+import feature_gen
+import incremental
+import storage
+import synthetic_data
+
+@pytest.fixture(scope='module')
+def small_file(tmp_path_factory):
+    file_path = tmp_path_factory.mktemp('raw') / 'small.csv'
+    synthetic_data.write_transactions(file_path, 400, 3, merchants=20, seed=7)
+    return str(file_path)
+
+def batch_features(input_filepath: str) -> pd.DataFrame:
+    raw_df = feature_gen.read_raw_data(input_filepath)
+    processed_df = pd.DataFrame(index=raw_df.index)
+    feature_gen.add_feature_columns(processed_df, raw_df)
+    return processed_df.reset_index(drop=True)
+
+def test_parallel_with_more_workers_than_cards(small_file):
+    raw_df = feature_gen.read_raw_data(small_file)
+    parallel_df = feature_gen.compute_features_parallel(raw_df, workers=8)
+    expected = batch_features(small_file)
+    pd.testing.assert_frame_equal(parallel_df[expected.columns], expected)
+
+def test_parallel_empty_frame(small_file):
+    raw_df = feature_gen.read_raw_data(small_file).iloc[:0]
+    parallel_df = feature_gen.compute_features_parallel(raw_df, workers=4)
+    assert len(parallel_df) == 0
+
+@pytest.fixture(scope='module')
+def split_files(tmp_path_factory):
+    # A history file and a later batch of the same cards
+    directory = tmp_path_factory.mktemp('split')
+    transactions = synthetic_data.generate_transactions(3000, 30, merchants=40, seed=11)
+    paths = {name: str(directory / f"{name}.csv") for name in ('history', 'batch', 'all')}
+    transactions.iloc[:2400].to_csv(paths['history'])
+    transactions.iloc[2400:].to_csv(paths['batch'])
+    transactions.to_csv(paths['all'])
+    return paths
+
+def test_incremental_update_survives_cached_rebuild(split_files, tmp_path):
+    cache = feature_cache.FeatureCache(str(tmp_path / 'cache'))
+    output_filepath = str(tmp_path / 'features.feather')
+    features = ['category', 'amt', 'transactions to date', 'average amount over 30 days']
+    feature_gen.create_df_cached(split_files['history'], cache, features=features, output_filepath=output_filepath)
+    incremental.initialize_state(split_files['history'], str(tmp_path / 'state'))
+    incremental.update_features(split_files['batch'], output_filepath, str(tmp_path / 'state'))
+    updated = storage.read_features(output_filepath)
+    assert len(updated) == 3000
+    # Only the requested steps' columns, as a full recompute would give
+    assert 'total_transactions' not in updated.columns
+
+    # The same request keeps the updated table, another one refuses to drop the batch
+    feature_gen.create_df_cached(split_files['history'], cache, features=features, output_filepath=output_filepath)
+    assert len(storage.read_features(output_filepath)) == 3000
+    with pytest.raises(ValueError, match='appended'):
+        feature_gen.create_df_cached(split_files['history'], cache, features=features + ['age'], output_filepath=output_filepath)
+
+def test_select_steps_narrows_window_step(small_file):
+    features = ['average amount over 30 days', 'maximum amount over 30 days']
+    rolling = [step for step in feature_gen.select_steps(features) if step.name == 'rolling_amount']
+    assert [step.columns for step in rolling] == [features]
+    raw_df = feature_gen.read_raw_data(small_file)
+    narrow_df, full_df = pd.DataFrame(index=raw_df.index), pd.DataFrame(index=raw_df.index)
+    feature_gen.add_feature_columns(narrow_df, raw_df, rolling)
+    feature_gen.add_feature_columns(full_df, raw_df, [step for step in feature_gen.FEATURE_STEPS if step.name == 'rolling_amount'])
+    pd.testing.assert_frame_equal(narrow_df, full_df[features])
+
+def full_recompute(input_filepath: str) -> pd.DataFrame:
+    # The batch features, keeping the input row labels
+    raw_df = feature_gen.read_raw_data(input_filepath)
+    processed_df = pd.DataFrame(index=raw_df.index)
+    feature_gen.add_feature_columns(processed_df, raw_df)
+    return processed_df
+
+def test_streaming_matches_batch(split_files, tmp_path):
+    expected = full_recompute(split_files['all'])
+    output_filepath = str(tmp_path / 'streaming.feather')
+    feature_gen.create_df_streaming(split_files['all'], 700, output_filepath)
+    # Streaming writes the rows in input order
+    streaming = storage.read_features(output_filepath).set_axis(expected.index.sort_values())
+    # Categories are stored as strings, since each chunk sees only some of them
+    streaming = streaming.astype({'category': expected['category'].dtype})
+    pd.testing.assert_frame_equal(streaming, expected.sort_index())
+
+def test_parallel_matches_batch(split_files):
+    expected = full_recompute(split_files['all'])
+    parallel = feature_gen.compute_features_parallel(feature_gen.read_raw_data(split_files['all']), workers=2)
+    pd.testing.assert_frame_equal(parallel[expected.columns], expected.reset_index(drop=True))
+
+def test_incremental_matches_full_recompute(split_files, tmp_path):
+    # The history computed in full, then the later batch added from the saved card state
+    output_filepath = str(tmp_path / 'incremental.feather')
+    storage.write_features(batch_features(split_files['history']), output_filepath)
+    incremental.initialize_state(split_files['history'], str(tmp_path / 'state'))
+    incremental.update_features(split_files['batch'], output_filepath, str(tmp_path / 'state'))
+    pd.testing.assert_frame_equal(storage.read_features(output_filepath), batch_features(split_files['all']))
+
+@pytest.mark.parametrize('drop, windows', [('cc_num', None), (None, ['1D', '14D'])])
+def test_incremental_update_rejects_tables_it_cannot_extend(split_files, tmp_path, drop, windows):
+    output_filepath = str(tmp_path / 'features.feather')
+    raw_df = feature_gen.read_raw_data(split_files['history'])
+    processed_df = pd.DataFrame(index=raw_df.index)
+    feature_gen.add_feature_columns(processed_df, raw_df, None if windows is None else feature_gen.feature_steps(windows))
+    storage.write_features(processed_df.drop(columns=[] if drop is None else [drop]), output_filepath)
+    incremental.initialize_state(split_files['history'], str(tmp_path / 'state'))
+    with pytest.raises(ValueError, match='cc_num' if drop else 'non-default windows'):
+        incremental.update_features(split_files['batch'], output_filepath, str(tmp_path / 'state'))
+    assert len(storage.read_features(output_filepath)) == 2400
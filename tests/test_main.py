@@ -0,0 +1,29 @@
+import os
+import pytest
+import main
+import model_artifacts
+import scoring_service
+import storage
+import synthetic_data
+
+def test_score_uses_the_saved_model_without_training(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('assets')
+    synthetic_data.write_transactions('train.csv', 3000, 30, seed=1)
+    synthetic_data.write_transactions('new.csv', 500, 30, seed=2)
+    main.main(['train', '--input', 'train.csv', '--max-depth', '4'])
+    model_path = model_artifacts.latest_model_path()
+
+    trained = []
+    monkeypatch.setattr(main, 'train', lambda *args, **kwargs: trained.append(args))
+    main.main(['score', 'new.csv', '--model', model_path, '--output', 'scores.csv'])
+    assert not trained
+    assert len(storage.read_features('scores.csv')) == 500
+    assert [name for name in os.listdir(model_artifacts.MODELS_DIR) if name.endswith('.joblib')] == [os.path.basename(model_path)]
+
+def test_missing_model_is_an_error(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(FileNotFoundError, match='train one first'):
+        scoring_service.build_scorer()
+    with pytest.raises(SystemExit):
+        main.main(['evaluate'])
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+import feature_store
+import sampling
+
+def make_matrix(rows: int = 50000, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    strata_values = {
+        'card': rng.integers(0, 200, rows),
+        'time': pd.Timestamp('2020-01-01').value + rng.integers(0, pd.Timedelta('120D').value, rows),
+    }
+    y = (rng.random(rows) < 0.03).astype(np.int8)
+    # The first feature is the row number, so the kept rows can be traced back to their strata
+    X = np.column_stack([np.arange(rows), rng.normal(size=rows)]).astype(np.float32)
+    return feature_store.FeatureMatrix(X, y, None), strata_values
+
+@pytest.mark.parametrize('stratify', [None, 'card', 'time'])
+def test_weights_restore_class_counts_of_every_stratum(stratify):
+    matrix, strata_values = make_matrix()
+    strata = None if stratify is None else strata_values[stratify]
+    sample = sampling.downsample(matrix, negative_rate=0.05, strata=strata, stratify=stratify, chunk_rows=7000)
+    assert sample.summary['unrepresented_rows'] == 0
+    assert sample.summary['sampled_rows'] < len(matrix.y) / 2
+
+    keys = np.zeros(len(matrix.y), dtype=np.int64) if strata is None else sampling.stratum_keys(strata, stratify)
+    expected = pd.Series(1.0, index=np.arange(len(matrix.y))).groupby([keys, matrix.y]).sum()
+    rows = sample.X[:, 0].astype(np.int64)
+    weighted = pd.Series(sample.sample_weight).groupby([keys[rows], sample.y]).sum()
+    pd.testing.assert_series_equal(weighted, expected, check_names=False)
+    assert (sample.sample_weight[sample.y == 1] == 1).all()
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.tree import DecisionTreeClassifier
+import feature_gen
+import storage
+import synthetic_data
+from category_vocabulary import CategoryVocabulary
+from scoring_service import FraudScorer
+
+FEATURES = ['category', 'amt', 'transactions to date', 'average amount over 30 days']
+
+def make_scorer(features: list = FEATURES, vocabulary: CategoryVocabulary = None, time_frame: str = '30D') -> FraudScorer:
+    rng = np.random.default_rng(0)
+    clf = DecisionTreeClassifier(max_depth=3).fit(rng.random((200, len(features))), rng.integers(0, 2, 200))
+    vocabulary = CategoryVocabulary({'category': ['food_dining', 'travel']}) if vocabulary is None else vocabulary
+    return FraudScorer(clf, features, vocabulary, time_frame)
+
+def transaction(time: str, **fields) -> dict:
+    return dict({'cc_num': 1, 'trans_date_trans_time': time, 'amt': 10.0, 'category': 'travel', 'city_pop': 500}, **fields)
+
+def test_malformed_transaction_leaves_card_state_unchanged():
+    scorer = make_scorer()
+    scorer.score(transaction('2019-01-01 00:00:00'))
+    for field in ('category', 'city_pop'):
+        with pytest.raises(KeyError):
+            malformed = transaction('2019-01-01 01:00:00')
+            del malformed[field]
+            scorer.score(malformed)
+    assert scorer.compute_features(transaction('2019-01-01 02:00:00'))['transactions to date'] == 2
+
+def test_out_of_order_transaction_is_rejected():
+    scorer = make_scorer()
+    scorer.score(transaction('2019-01-02 00:00:00'))
+    with pytest.raises(ValueError):
+        scorer.score(transaction('2019-01-01 00:00:00'))
+    features = scorer.compute_features(transaction('2019-01-02 00:00:00', amt=30.0))
+    assert features['time_since_last_purchase'] == 0
+    assert features['transactions to date'] == 2 and features['average amount over 30 days'] == 20.0
+
+def test_whole_file_count_is_not_served():
+    with pytest.raises(ValueError, match='total_transactions'):
+        make_scorer(['amt', 'total_transactions'])
+
+@pytest.mark.parametrize('time_frame', ['30D', '7D'])
+def test_replay_matches_batch_features(tmp_path, monkeypatch, time_frame):
+    # The feature cache goes under the working directory
+    monkeypatch.chdir(tmp_path)
+    input_filepath = str(tmp_path / 'transactions.csv')
+    synthetic_data.write_transactions(input_filepath, 10000, 100, seed=3)
+    raw = pd.read_csv(input_filepath)
+    vocabulary = CategoryVocabulary.fit(raw, ['category'])
+    features = FraudScorer.online_features(time_frame)
+    scorer = make_scorer(features, vocabulary, time_frame)
+    online = pd.DataFrame([scorer.compute_features(transaction) for transaction in raw.to_dict('records')])
+    online[['cc_num', 'trans_date_trans_time']] = raw[['cc_num', 'trans_date_trans_time']]
+    online = online.sort_values(['cc_num', 'trans_date_trans_time'], kind='stable').reset_index(drop=True)
+
+    output_filepath = feature_gen.generate_features(input_filepath, str(tmp_path / 'features.feather'), features,
+                                                    time_frames=[time_frame])
+    batch = storage.read_features(output_filepath)
+    batch['category'] = vocabulary.encode('category', batch['category'])
+    # As in the feature matrix, times between purchases are in seconds and every feature is float32
+    batch['time_since_last_purchase'] = batch['time_since_last_purchase'].dt.total_seconds()
+    for feature in features:
+        np.testing.assert_array_equal(online[feature].to_numpy(dtype=np.float32), batch[feature].to_numpy(dtype=np.float32),
+                                      err_msg=feature)
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from sklearn.tree import DecisionTreeClassifier
+import tree_inference
+
+def make_data(rows: int = 20000, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, 5)).astype(np.float32)
+    y = (X[:, 0] + rng.normal(scale=0.5, size=rows) > 1.5).astype(np.int8)
+    return X, y
+
+@pytest.mark.parametrize('class_weight, weighted', [(None, False), ('balanced', False), (None, True)])
+def test_compiled_tree_matches_classifier(class_weight, weighted):
+    X, y = make_data()
+    sample_weight = np.random.default_rng(1).uniform(0.5, 3.0, len(y)) if weighted else None
+    clf = DecisionTreeClassifier(max_depth=8, class_weight=class_weight, random_state=0).fit(X, y, sample_weight=sample_weight)
+    tree_inference.verify(tree_inference.CompiledTree(clf), clf, make_data(seed=2)[0])
+
+def test_compiled_tree_routes_missing_values_like_classifier():
+    X, y = make_data()
+    rng = np.random.default_rng(3)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    clf = DecisionTreeClassifier(max_depth=8, random_state=0).fit(X, y)
+    X_test = make_data(seed=4)[0]
+    X_test[rng.random(X_test.shape) < 0.1] = np.nan
+    tree_inference.verify(tree_inference.CompiledTree(clf), clf, X_test)
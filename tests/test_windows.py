@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+import windows
+
+AGGREGATES = ['count', 'sum', 'mean', 'min', 'max', 'std']
+
+def make_transactions(rows: int, cards: int, seed: int = 0) -> pd.DataFrame:
+    # Coarse timestamps so windows often hold several rows and rows share timestamps
+    rng = np.random.default_rng(seed)
+    minutes = rng.integers(0, 60 * 24 * 90, rows) // 30 * 30
+    amounts = rng.gamma(2.0, 40.0, rows).round(2)
+    amounts[rng.random(rows) < 0.05] = np.nan
+    return pd.DataFrame({
+        'cc_num': rng.integers(0, cards, rows) + 10 ** 15,
+        'trans_date_trans_time': pd.Timestamp('2019-01-01') + pd.to_timedelta(minutes, unit='min'),
+        'amt': amounts,
+    })
+
+def pandas_rolling(raw_df: pd.DataFrame, time_frame: str, aggregates: list) -> pd.DataFrame:
+    # The reference: pandas' own offset-based rolling windows, card by card
+    ordered = raw_df.sort_values(['cc_num', 'trans_date_trans_time'], kind='stable')
+    parts = []
+    for _, card in ordered.groupby('cc_num', sort=False):
+        rolling = card.set_index('trans_date_trans_time')['amt'].rolling(time_frame)
+        part = pd.DataFrame({aggregate: getattr(rolling, aggregate)().to_numpy() for aggregate in aggregates}, index=card.index)
+        parts.append(part)
+    result = pd.concat(parts).loc[raw_df.index]
+    if 'sum' in result:
+        # pandas sums an all-missing window to 0, the engine gives NaN like for the mean
+        result.loc[result['count'] == 0, 'sum'] = np.nan
+    return result
+
+@pytest.mark.parametrize('time_frame', ['1h', '1D', '30D'])
+def test_matches_pandas_rolling(time_frame):
+    raw_df = make_transactions(3000, 25)
+    raw_df = raw_df.sort_values(['cc_num', 'trans_date_trans_time'], kind='stable')
+    result = windows.rolling_aggregate(raw_df, 'amt', time_frame, AGGREGATES)
+    expected = pandas_rolling(raw_df, time_frame, AGGREGATES)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, rtol=1e-9, atol=1e-9)
+
+def test_unsorted_input_keeps_row_order():
+    raw_df = make_transactions(2000, 10, seed=1)
+    shuffled = raw_df.sample(frac=1.0, random_state=2)
+    result = windows.rolling_aggregate(shuffled, 'amt', '7D', AGGREGATES)
+    expected = pandas_rolling(shuffled, '7D', AGGREGATES)
+    assert result.index.equals(shuffled.index)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, rtol=1e-9, atol=1e-9)
+
+def test_many_windows_match_single_windows():
+    raw_df = make_transactions(2000, 10, seed=3)
+    time_frames = ['1h', '1D', '30D']
+    aggregates = AGGREGATES + ['zscore']
+    many = windows.rolling_aggregate_many(raw_df, 'amt', time_frames, aggregates)
+    for time_frame in time_frames:
+        pd.testing.assert_frame_equal(many[time_frame], windows.rolling_aggregate(raw_df, 'amt', time_frame, aggregates))
+
+def test_zscore_is_deviation_over_std():
+    raw_df = make_transactions(2000, 10, seed=4)
+    result = windows.rolling_aggregate(raw_df, 'amt', '30D', ['mean', 'std', 'zscore'])
+    expected = (raw_df['amt'] - result['mean']) / result['std']
+    spread = result['std'] > 0
+    np.testing.assert_allclose(result.loc[spread, 'zscore'], expected[spread], rtol=1e-9)
+    assert (result.loc[result['std'] == 0, 'zscore'] == 0).all()
+
+def test_single_row():
+    raw_df = make_transactions(1, 1)
+    raw_df['amt'] = 12.5
+    result = windows.rolling_aggregate(raw_df, 'amt', '30D', AGGREGATES + ['zscore'])
+    assert result.iloc[0][['count', 'sum', 'mean', 'min', 'max']].tolist() == [1.0, 12.5, 12.5, 12.5, 12.5]
+    assert np.isnan(result.iloc[0]['std']) and np.isnan(result.iloc[0]['zscore'])
+
+@pytest.mark.parametrize('closed', windows.WINDOW_CLOSED)
+def test_empty_frame(closed):
+    raw_df = make_transactions(0, 1)
+    result = windows.rolling_aggregate(raw_df, 'amt', '30D', list(windows.WINDOW_AGGREGATES), closed=closed)
+    assert len(result) == 0 and list(result.columns) == list(windows.WINDOW_AGGREGATES)
+
+def test_neither_excludes_rows_at_the_same_time():
+    raw_df = pd.DataFrame({
+        'cc_num': [1, 1, 1, 1],
+        'trans_date_trans_time': pd.to_datetime(['2019-01-01 00:00', '2019-01-01 01:00', '2019-01-01 01:00', '2019-01-03 00:00']),
+        'amt': [1.0, 2.0, 4.0, 8.0],
+    })
+    result = windows.rolling_aggregate(raw_df, 'amt', '1D', ['count', 'sum'], closed='neither')
+    assert result['count'].tolist() == [0, 1, 1, 0]
+    assert result['sum'].iloc[1:3].tolist() == [1.0, 1.0]
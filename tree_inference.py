@@ -0,0 +1,170 @@
+import numpy as np
+from sklearn.tree import DecisionTreeClassifier
+
+# Constants
+# Rows are walked through the tree in blocks small enough for their node and value arrays to stay in cache
+BATCH_BLOCK_ROWS = 16384
+
+class CompiledTree:
+    """
+    A fitted DecisionTreeClassifier exported to flat NumPy node arrays.
+
+    Prediction walks these arrays directly. A batch is advanced one tree level at a time over a
+    block of rows, with leaves pointing back to themselves so every level is the same three
+    gathers for every row. A single row is walked with plain Python lists, skipping the input
+    validation and DataFrame handling that dominate sklearn's cost for small inputs. Inputs are
+    rounded to float32 and compared to the float64 thresholds exactly like sklearn does, so the
+    outputs agree with clf.predict and clf.predict_proba bit for bit.
+    """
+
+    def __init__(self, clf: DecisionTreeClassifier) -> None:
+        tree = clf.tree_
+        if tree.n_outputs != 1:
+            raise ValueError("Only single-output classifiers can be compiled")
+        self.classes = clf.classes_
+        self.n_features = tree.n_features
+        self.max_depth = tree.max_depth
+        self.left = tree.children_left.astype(np.intp)
+        self.right = tree.children_right.astype(np.intp)
+        is_leaf = self.left < 0
+        self.feature = np.where(is_leaf, 0, tree.feature).astype(np.intp)
+        self.threshold = tree.threshold.astype(np.float64)
+        # Trees fitted by older sklearn versions have no missing value routing; NaN then goes right
+        missing_go_to_left = getattr(tree, 'missing_go_to_left', None)
+        self.missing_go_to_left = np.zeros(tree.node_count, dtype=bool) if missing_go_to_left is None else missing_go_to_left.astype(bool)
+
+        # Batch layout: children[2 * node + went_left], with leaves as their own children and an
+        # infinite threshold, so walking max_depth levels leaves every row at its leaf
+        nodes = np.arange(tree.node_count)
+        self._children = np.stack([np.where(is_leaf, nodes, self.right), np.where(is_leaf, nodes, self.left)], axis=1).ravel()
+        self._batch_threshold = np.where(is_leaf, np.inf, self.threshold)
+
+        # The leaf values are the class fractions, which DecisionTreeClassifier.predict_proba
+        # returns as they are; normalising them again would change the last bit of some
+        self.proba = tree.value[:, 0, :clf.n_classes_].astype(np.float64)
+        self.prediction = self.classes.take(np.argmax(self.proba, axis=1), axis=0)
+
+        # Python lists make the single-row walk several times faster than NumPy scalar indexing
+        self._nodes = list(zip(self.left.tolist(), self.right.tolist(), self.feature.tolist(),
+                               self.threshold.tolist(), self.missing_go_to_left.tolist()))
+        self._proba_rows = [row for row in self.proba]
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """
+        Find the leaf reached by every row.
+
+        Args:
+            X (np.ndarray): A 2D array of feature values, ideally C-contiguous float32.
+
+        Returns:
+            np.ndarray: The leaf node index of every row.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        leaves = np.empty(n_rows, dtype=np.intp)
+        row_offsets = np.arange(min(n_rows, BATCH_BLOCK_ROWS), dtype=np.intp) * n_features
+        for start in range(0, n_rows, BATCH_BLOCK_ROWS):
+            block = X[start:start + BATCH_BLOCK_ROWS]
+            values, offsets = block.ravel(), row_offsets[:len(block)]
+            has_missing = np.isnan(block).any()
+            nodes = np.zeros(len(block), dtype=np.intp)
+            for _ in range(self.max_depth):
+                value = values[offsets + self.feature[nodes]]
+                go_left = value <= self._batch_threshold[nodes]
+                if has_missing:
+                    go_left |= np.isnan(value) & self.missing_go_to_left[nodes]
+                nodes = self._children[2 * nodes + go_left]
+            leaves[start:start + len(block)] = nodes
+        return leaves
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predict class probabilities for a batch of rows.
+
+        Args:
+            X (np.ndarray): A 2D array of feature values, ideally C-contiguous float32.
+
+        Returns:
+            np.ndarray: An (n_rows, n_classes) array of probabilities.
+        """
+        return self.proba[self.apply(X)]
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predict the class of a batch of rows.
+
+        Args:
+            X (np.ndarray): A 2D array of feature values, ideally C-contiguous float32.
+
+        Returns:
+            np.ndarray: The predicted class of every row.
+        """
+        return self.prediction[self.apply(X)]
+
+    def apply_one(self, row: list) -> int:
+        """
+        Find the leaf reached by a single row, without any input validation.
+
+        Args:
+            row (list): The feature values of one row, already rounded to float32
+                (e.g. via np.float32 or a float32 array's tolist()).
+
+        Returns:
+            int: The leaf node index.
+        """
+        nodes = self._nodes
+        node = 0
+        left, right, feature, threshold, missing_left = nodes[0]
+        while left >= 0:
+            value = row[feature]
+            if value <= threshold or (value != value and missing_left):
+                node = left
+            else:
+                node = right
+            left, right, feature, threshold, missing_left = nodes[node]
+        return node
+
+    def predict_proba_one(self, row: list) -> np.ndarray:
+        """
+        Predict class probabilities for a single row, see apply_one.
+
+        Args:
+            row (list): The feature values of one row, already rounded to float32.
+
+        Returns:
+            np.ndarray: The probability of every class.
+        """
+        return self._proba_rows[self.apply_one(row)]
+
+    def predict_one(self, row: list):
+        """
+        Predict the class of a single row, see apply_one.
+
+        Args:
+            row (list): The feature values of one row, already rounded to float32.
+
+        Returns:
+            The predicted class.
+        """
+        return self.prediction[self.apply_one(row)]
+
+def verify(compiled: CompiledTree, clf: DecisionTreeClassifier, X: np.ndarray) -> None:
+    """
+    Check that a compiled tree reproduces the classifier exactly on the given rows.
+
+    Args:
+        compiled (CompiledTree): The compiled tree.
+        clf (DecisionTreeClassifier): The classifier it was compiled from.
+        X (np.ndarray): A 2D array of feature values.
+
+    Returns:
+        None
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    if not np.array_equal(compiled.predict_proba(X), clf.predict_proba(X, check_input=False)):
+        raise AssertionError("Compiled tree probabilities differ from predict_proba")
+    if not np.array_equal(compiled.predict(X), clf.predict(X, check_input=False)):
+        raise AssertionError("Compiled tree predictions differ from predict")
+    for row in X[:1000].tolist():
+        if compiled.predict_one(row) != clf.predict(np.array([row], dtype=np.float32), check_input=False)[0]:
+            raise AssertionError("Compiled single-row prediction differs from predict")
@@ -0,0 +1,292 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+# Constants
+WINDOW_AGGREGATES = ('count', 'sum', 'mean', 'min', 'max', 'std', 'zscore')
+# 'right' windows end at the row itself, 'neither' windows end before the first row at the same time
+WINDOW_CLOSED = ('right', 'neither')
+
+def group_codes(keys: np.ndarray) -> np.ndarray:
+    """
+    Map every row to a dense integer code of its group.
+
+    Args:
+        keys (np.ndarray): The group key of every row (e.g. the card number). Categorical
+            arrays are factorized from their codes, without materializing the strings.
+
+    Returns:
+        np.ndarray: An int64 array of group codes, one per row.
+    """
+    codes, _ = pd.factorize(keys, sort=False)
+    return codes.astype(np.int64, copy=False)
+
+# Rows of group g are offsets[g]:offsets[g + 1] of a frame sorted by group
+GroupIndex = namedtuple('GroupIndex', ['codes', 'offsets', 'counts'])
+
+def contiguous_groups(keys: np.ndarray) -> GroupIndex:
+    """
+    Index the groups of rows whose keys are already contiguous, e.g. a frame sorted by card.
+
+    Groups are found by comparing neighbouring keys, so unlike group_codes nothing is hashed.
+    Codes number the groups in order of appearance.
+
+    Args:
+        keys (np.ndarray): The group key of every row, with equal keys next to each other.
+
+    Returns:
+        GroupIndex: The int64 group code of every row, the offset of every group's first row
+            followed by the number of rows, and the number of rows of every group.
+    """
+    keys = np.asarray(keys)
+    starts_group = np.empty(len(keys), dtype=bool)
+    starts_group[:1] = True
+    np.not_equal(keys[1:], keys[:-1], out=starts_group[1:])
+    codes = np.cumsum(starts_group, dtype=np.int64) - 1
+    offsets = np.append(np.flatnonzero(starts_group), len(keys))
+    return GroupIndex(codes, offsets, np.diff(offsets))
+
+def window_bounds_many(codes: np.ndarray, times: np.ndarray, time_frames: list, closed: str = 'right') -> tuple:
+    """
+    Find, for every row, the rows of its trailing time window, for several window lengths at once.
+
+    The rows must already be sorted by group code and then by time. With closed='right' the
+    window of row i is (t_i - time_frame, t_i] within its own group and ends at row i itself,
+    which is the same convention pandas uses for offset-based rolling windows. With
+    closed='neither' it is (t_i - time_frame, t_i): only rows strictly earlier than row i,
+    so nothing recorded at the same time as row i, including row i itself, is visible. The
+    sorted search keys are built once and shared by all windows, so every further window
+    only costs one binary search per row.
+
+    Args:
+        codes (np.ndarray): The group code of every row.
+        times (np.ndarray): The datetime64[ns] timestamp of every row.
+        time_frames (list): The window lengths as pandas offset strings.
+        closed (str): One of WINDOW_CLOSED.
+
+    Returns:
+        tuple: A list with the int64 first row of every window for each time frame, and the
+            int64 array of one past the last row, which all time frames share.
+    """
+    if closed not in WINDOW_CLOSED:
+        raise ValueError(f"closed must be one of {WINDOW_CLOSED}, not {closed!r}")
+    times = times.view(np.int64)
+    lengths = [pd.Timedelta(time_frame).value for time_frame in time_frames]
+    if len(times) == 0:
+        return [np.zeros(0, dtype=np.int64) for _ in lengths], np.zeros(0, dtype=np.int64)
+
+    # Pack (group, time) into one sorted int64 key, spacing the groups further apart than the
+    # longest window so no query can reach into the previous group. Times are coarsened to the
+    # largest unit that keeps them exact when nanoseconds would overflow the key.
+    offsets = times - times.min()
+    span = int(offsets.max()) + max(lengths) + 1
+    groups = int(codes.max()) + 1
+    keys = None
+    for unit in (1, 10**3, 10**6, 10**9):
+        if unit > 1 and (any(length % unit for length in lengths) or (offsets % unit).any()):
+            break
+        stride = span // unit + 1
+        if groups * stride < 2**62:
+            keys = codes * stride + offsets // unit
+            starts = [np.searchsorted(keys, keys - length // unit, side='right') for length in lengths]
+            break
+
+    if keys is None:
+        # Otherwise rank the timestamps, which always fits but needs a sort of its own
+        unique_times = np.sort(times)
+        unique_times = unique_times[np.concatenate(([True], unique_times[1:] != unique_times[:-1]))]
+        stride = len(unique_times) + 1
+        keys = codes * stride + np.searchsorted(unique_times, times)
+        starts = [np.searchsorted(keys, codes * stride + np.searchsorted(unique_times, times - length, side='right'), side='left')
+                  for length in lengths]
+
+    if closed == 'right':
+        ends = np.arange(1, len(keys) + 1)
+    else:
+        ends = np.searchsorted(keys, keys, side='left')
+    return starts, ends
+
+def _prefix_sums(values: np.ndarray, dtype: type = np.float64) -> np.ndarray:
+    # Prefix sums with a leading zero so that sums over [start, end) are a single subtraction.
+    sums = np.empty(len(values) + 1, dtype=dtype)
+    sums[0] = 0.0
+    np.cumsum(values, out=sums[1:])
+    return sums
+
+def _range_extreme(values: np.ndarray, bounds: list, ufunc: np.ufunc) -> list:
+    # Answer every [start, end) range query with a sparse table that is built one level at a
+    # time, so only the current level is kept in memory. Each query is resolved on the level
+    # whose block length is the largest power of two not exceeding its range length. The
+    # levels are shared by all (starts, ends) pairs in bounds, e.g. one pair per window length.
+    # Group the queries by level once, with empty ranges on level -1
+    by_level, level_offsets = [], []
+    for starts, ends in bounds:
+        lengths = ends - starts
+        query_levels = np.full(len(lengths), -1, dtype=np.int64)
+        nonempty = lengths > 0
+        query_levels[nonempty] = np.floor(np.log2(lengths[nonempty])).astype(np.int64)
+        by_level.append(np.argsort(query_levels, kind='stable'))
+        level_offsets.append(np.cumsum(np.bincount(query_levels + 1)))
+
+    results = [np.full(len(values), np.nan) for _ in bounds]
+    table = values
+    max_level = max(len(offsets) for offsets in level_offsets) - 2 if bounds else -1
+    for level in range(max_level + 1):
+        if level > 0:
+            half = 1 << (level - 1)
+            table = ufunc(table[:-half], table[half:])
+        block = 1 << level
+        for (starts, ends), rows_by_level, offsets, result in zip(bounds, by_level, level_offsets, results):
+            if level + 1 < len(offsets):
+                rows = rows_by_level[offsets[level]:offsets[level + 1]]
+                result[rows] = ufunc(table[starts[rows]], table[ends[rows] - block])
+    return results
+
+def rolling_aggregate(raw_df: pd.DataFrame, value_column: str, time_frame: str, aggregates: list,
+                      group_column: str = 'cc_num', time_column: str = 'trans_date_trans_time',
+                      closed: str = 'right', codes: np.ndarray = None, scale: int = None) -> pd.DataFrame:
+    """
+    Compute trailing time-window aggregates of a column for every group in one vectorized pass.
+
+    Every requested aggregate is derived from the same window offsets: sums, counts, means and
+    standard deviations from prefix sums, minima and maxima from a sparse range table. The
+    cost grows with the number of rows, not with the number of groups.
+
+    Args:
+        raw_df (pd.DataFrame): The DataFrame containing the source columns.
+        value_column (str): The column to aggregate (e.g. 'amt').
+        time_frame (str): The time frame for rolling window calculations.
+        aggregates (list): Aggregate names, any of WINDOW_AGGREGATES.
+        group_column (str): The column identifying each group.
+        time_column (str): The datetime column the windows are measured on.
+        closed (str): Whether each window ends at its row ('right') or before the row's
+            timestamp ('neither'), see window_bounds_many.
+        codes (np.ndarray): Precomputed group codes of group_column (e.g. from contiguous_groups),
+            or None to factorize the column.
+        scale (int): Sum the values as whole multiples of 1 / scale, see rolling_aggregate_many.
+
+    Returns:
+        pd.DataFrame: One column per aggregate, aligned with the index of raw_df.
+    """
+    return rolling_aggregate_many(raw_df, value_column, [time_frame], aggregates, group_column, time_column, closed, codes,
+                                  scale)[time_frame]
+
+def rolling_aggregate_many(raw_df: pd.DataFrame, value_column: str, time_frames: list, aggregates: list,
+                           group_column: str = 'cc_num', time_column: str = 'trans_date_trans_time',
+                           closed: str = 'right', codes: np.ndarray = None, scale: int = None) -> dict:
+    """
+    Compute trailing time-window aggregates for several window lengths in one shared pass.
+
+    The grouping, the sort check, the search keys, the prefix sums and the levels of the
+    sparse range table are built once for all windows (see rolling_aggregate); each window
+    only adds one binary search per row and the lookups of its own aggregates. 'zscore' is
+    how many window standard deviations a row's value lies from its window mean, 0 for a
+    window of identical values. With a scale, sums and means are taken of the values rounded
+    to whole multiples of 1 / scale (e.g. cents), which add up exactly in int64, so they are
+    the same as those of any other exact running sum, e.g. one updated transaction by transaction.
+
+    Args:
+        raw_df (pd.DataFrame): The DataFrame containing the source columns.
+        value_column (str): The column to aggregate (e.g. 'amt').
+        time_frames (list): The window lengths as pandas offset strings.
+        aggregates (list): Aggregate names, any of WINDOW_AGGREGATES.
+        group_column (str): The column identifying each group.
+        time_column (str): The datetime column the windows are measured on.
+        closed (str): Whether each window ends at its row ('right') or before the row's
+            timestamp ('neither'), see window_bounds_many.
+        codes (np.ndarray): Precomputed group codes of group_column (e.g. from contiguous_groups),
+            or None to factorize the column.
+        scale (int): The number of units per 1 to sum the values in exactly (e.g. 100 for
+            cents), or None to sum them as floats.
+
+    Returns:
+        dict: For every time frame, a DataFrame with one column per aggregate, aligned with the index of raw_df.
+    """
+    unknown = set(aggregates) - set(WINDOW_AGGREGATES)
+    if unknown:
+        raise ValueError(f"Unknown window aggregates: {unknown}")
+
+    if codes is None:
+        codes = group_codes(raw_df[group_column].array)
+    times = raw_df[time_column].to_numpy(dtype='datetime64[ns]')
+    values = raw_df[value_column].to_numpy(dtype=np.float64)
+
+    # Sort by group and then time, unless the frame already is
+    order = None
+    if len(codes) > 1:
+        # Codes are numbered in order of first appearance, so contiguous groups never step down
+        time_ints = times.view(np.int64)
+        same_group = codes[1:] == codes[:-1]
+        if (codes[1:] < codes[:-1]).any() or (same_group & (time_ints[1:] < time_ints[:-1])).any():
+            order = np.lexsort((time_ints, codes))
+            codes, times, values = codes[order], times[order], values[order]
+
+    all_starts, ends = window_bounds_many(codes, times, time_frames, closed)
+    needed = set(aggregates)
+    if 'zscore' in needed:
+        needed |= {'mean', 'std'}
+
+    valid = ~np.isnan(values)
+    counts = _prefix_sums(valid)
+    exact = scale is not None and bool(needed & {'sum', 'mean'})
+    if exact:
+        units = _prefix_sums(np.where(valid, np.rint(values * scale), 0.0).astype(np.int64), dtype=np.int64)
+    if needed & ({'std'} if exact else {'sum', 'mean', 'std'}):
+        # Center each group on its own mean so the prefix sums stay small and precise
+        # bincount gives int64 rather than float64 for no rows, so fix the dtypes
+        group_sums = np.bincount(codes, weights=np.where(valid, values, 0.0)).astype(np.float64, copy=False)
+        group_counts = np.bincount(codes, weights=valid).astype(np.float64, copy=False)
+        group_means = np.divide(group_sums, group_counts, out=np.zeros_like(group_sums), where=group_counts > 0)
+        row_means = group_means[codes]
+        centered = np.where(valid, values - row_means, 0.0)
+        sums = _prefix_sums(centered)
+    if 'std' in needed:
+        # Squares only ever grow the prefix sums, so accumulate them in extended precision
+        squares = _prefix_sums(centered * centered, dtype=np.longdouble)
+        # The last row whose value differs from the one before, skipping missing values; a
+        # window holds identical values exactly when no such row falls after its first row
+        filled = pd.Series(values).ffill().to_numpy()
+        changes = np.zeros(len(values), dtype=np.int64)
+        changes[1:] = np.where(filled[1:] != filled[:-1], np.arange(1, len(values)), 0)
+        last_change = np.maximum.accumulate(changes)
+    bounds = [(starts, ends) for starts in all_starts]
+    minima = _range_extreme(values, bounds, np.fmin) if 'min' in needed else None
+    maxima = _range_extreme(values, bounds, np.fmax) if 'max' in needed else None
+
+    results = {}
+    for position, (time_frame, starts) in enumerate(zip(time_frames, all_starts)):
+        count = counts[ends] - counts[starts]
+        columns = {'count': count}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if needed & ({'std'} if exact else {'sum', 'mean', 'std'}):
+                centered_sum = sums[ends] - sums[starts]
+                total = centered_sum + count * row_means
+                columns['sum'] = np.where(count > 0, total, np.nan)
+                columns['mean'] = np.where(count > 0, total / count, np.nan)
+            if exact:
+                unit_sum = units[ends] - units[starts]
+                columns['sum'] = np.where(count > 0, unit_sum / scale, np.nan)
+                columns['mean'] = np.where(count > 0, unit_sum / count / scale, np.nan)
+            if minima is not None:
+                columns['min'] = minima[position]
+            if maxima is not None:
+                columns['max'] = maxima[position]
+            if 'std' in needed:
+                sum_squares = (squares[ends] - squares[starts]).astype(np.float64)
+                variance = (sum_squares - centered_sum * centered_sum / count) / (count - 1)
+                std = np.sqrt(np.clip(variance, 0.0, None))
+                # A window of identical values has exactly zero spread
+                std[last_change[np.maximum(ends - 1, 0)] <= starts] = 0.0
+                columns['std'] = np.where(count > 1, std, np.nan)
+            if 'zscore' in needed:
+                deviation = values - columns['mean']
+                columns['zscore'] = np.where(columns['std'] > 0, deviation / columns['std'], np.where(columns['std'] == 0, 0.0, np.nan))
+
+        result = pd.DataFrame({name: columns[name] for name in aggregates})
+        if order is not None:
+            unsorted = np.empty_like(order)
+            unsorted[order] = np.arange(len(order))
+            result = result.iloc[unsorted]
+        result.index = raw_df.index
+        results[time_frame] = result
+    return results